@@ -1,5 +1,7 @@
 from sqlalchemy import text
+from sqlmodel import Session
 from .database import engine
+from .services import crear_sucursal_principal
 
 
 def purge_db_with_sql():
@@ -7,17 +9,27 @@ def purge_db_with_sql():
     Deja la BD en blanco usando SQL puro.
     - SQLite: PRAGMA OFF/ON + DELETE table por table, cada una por separado.
     - Postgres: TRUNCATE ... RESTART IDENTITY CASCADE.
+    Al final vuelve a crear la sucursal principal.
     """
     if engine.dialect.name == "sqlite":
         with engine.begin() as conn:
             
             conn.exec_driver_sql("PRAGMA foreign_keys = OFF")
+            conn.exec_driver_sql("DELETE FROM resumendiario")
+            conn.exec_driver_sql("DELETE FROM stockcierre")
+            conn.exec_driver_sql("DELETE FROM cierrediario")
+            conn.exec_driver_sql("DELETE FROM historialprecio")
+            conn.exec_driver_sql("DELETE FROM cambioprecio")
+            conn.exec_driver_sql("DELETE FROM transferencia")
+            conn.exec_driver_sql("DELETE FROM movimientoinventario")
             conn.exec_driver_sql("DELETE FROM detalleventa")
             conn.exec_driver_sql("DELETE FROM venta")
             conn.exec_driver_sql("DELETE FROM inventario")
             conn.exec_driver_sql("DELETE FROM llanta")
             conn.exec_driver_sql("DELETE FROM cliente")
             conn.exec_driver_sql("DELETE FROM asesor")
+            conn.exec_driver_sql("DELETE FROM sucursal")
+            conn.exec_driver_sql("DELETE FROM claveidempotencia")
 
             conn.exec_driver_sql("PRAGMA foreign_keys = ON")
 
@@ -31,11 +43,23 @@ def purge_db_with_sql():
         with engine.begin() as conn:
             conn.execute(text("""
                 TRUNCATE TABLE
+                  resumendiario,
+                  stockcierre,
+                  cierrediario,
+                  historialprecio,
+                  cambioprecio,
+                  transferencia,
+                  movimientoinventario,
                   detalleventa,
                   venta,
                   inventario,
                   llanta,
                   cliente,
-                  asesor
+                  asesor,
+                  sucursal,
+                  claveidempotencia
                 RESTART IDENTITY CASCADE
             """))
+
+    with Session(engine) as session:
+        crear_sucursal_principal(session)
@@ -0,0 +1,197 @@
+import asyncio
+import itertools
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from .database import DB_POOL_SIZE, DB_MAX_OVERFLOW
+
+# Por defecto no se admiten más solicitudes concurrentes que conexiones tiene el pool:
+# lo que exceda espera aquí (barato) y no dentro del threadpool bloqueando un hilo.
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "5"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "2"))
+
+
+@dataclass
+class ClaseAdmision:
+    prioridad: int  # menor = se atiende primero
+    limite: int     # máximo de solicitudes concurrentes de esta clase
+    cola: int       # máximo de solicitudes esperando
+
+
+CLASES: Dict[str, ClaseAdmision] = {
+    "venta": ClaseAdmision(
+        prioridad=0,
+        limite=ADMISSION_MAX_CONCURRENCY,
+        cola=int(os.getenv("ADMISSION_QUEUE_VENTA", "100")),
+    ),
+    "general": ClaseAdmision(
+        prioridad=1,
+        limite=ADMISSION_MAX_CONCURRENCY,
+        cola=int(os.getenv("ADMISSION_QUEUE_GENERAL", "50")),
+    ),
+    "lectura": ClaseAdmision(
+        prioridad=2,
+        limite=int(os.getenv("ADMISSION_LIMIT_LECTURA", str(max(1, ADMISSION_MAX_CONCURRENCY // 3)))),
+        cola=int(os.getenv("ADMISSION_QUEUE_LECTURA", "20")),
+    ),
+}
+
+# (método, patrón de ruta, clase). La primera coincidencia gana; clase None = sin control.
+REGLAS: List[Tuple[str, re.Pattern, Optional[str]]] = [
+    ("GET", re.compile(r"^/$"), None),
+    ("GET", re.compile(r"^/admision/metricas$"), None),
+    ("GET", re.compile(r"^/(docs|redoc|openapi\.json)"), None),
+    ("POST", re.compile(r"^/ventas$"), "venta"),
+    ("PUT", re.compile(r"^/inventario/\d+/ajustar$"), "venta"),
+    ("POST", re.compile(r"^/inventario/transferencias$"), "venta"),
+    ("GET", re.compile(r"^/ventas"), "lectura"),
+    ("GET", re.compile(r"^/health$"), "lectura"),
+    ("GET", re.compile(r"^/inventario/sugerencias$"), "lectura"),
+    ("GET", re.compile(r"^/reportes/"), "lectura"),
+]
+
+
+def clasificar(method: str, path: str) -> Optional[str]:
+    for metodo, patron, clase in REGLAS:
+        if metodo == method and patron.match(path):
+            return clase
+    return "general"
+
+
+class ControlAdmision:
+    """
+    Semáforo con prioridad y colas acotadas por clase de ruta.
+    Vive en el event loop del worker; no es seguro entre hilos ni entre procesos.
+    """
+
+    def __init__(self, capacidad: int, clases: Dict[str, ClaseAdmision], espera_max: float):
+        self.capacidad = capacidad
+        self.clases = clases
+        self.espera_max = espera_max
+        self.activos_total = 0
+        self.activos = {c: 0 for c in clases}
+        self.en_cola = {c: 0 for c in clases}
+        self.admitidas = {c: 0 for c in clases}
+        self.rechazadas = {c: 0 for c in clases}
+        self.expiradas = {c: 0 for c in clases}
+        self._esperando: List[Tuple[int, int, str, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    def _puede_entrar(self, clase: str) -> bool:
+        return (self.activos_total < self.capacidad
+                and self.activos[clase] < self.clases[clase].limite)
+
+    def _entrar(self, clase: str) -> None:
+        self.activos_total += 1
+        self.activos[clase] += 1
+        self.admitidas[clase] += 1
+
+    def _despertar(self) -> None:
+        for espera in sorted(self._esperando):
+            if self.activos_total >= self.capacidad:
+                break
+            _, _, clase, fut = espera
+            if fut.done():
+                continue
+            if self._puede_entrar(clase):
+                self._esperando.remove(espera)
+                self.en_cola[clase] -= 1
+                self._entrar(clase)
+                fut.set_result(True)
+
+    async def adquirir(self, clase: str) -> bool:
+        prioridad = self.clases[clase].prioridad
+        hay_prioritarios = any(p <= prioridad for p, _, _, _ in self._esperando)
+        if self._puede_entrar(clase) and not hay_prioritarios:
+            self._entrar(clase)
+            return True
+
+        if self.en_cola[clase] >= self.clases[clase].cola:
+            self.rechazadas[clase] += 1
+            return False
+
+        fut = asyncio.get_running_loop().create_future()
+        espera = (prioridad, next(self._seq), clase, fut)
+        self._esperando.append(espera)
+        self.en_cola[clase] += 1
+        admitida = False
+        try:
+            await asyncio.wait_for(fut, self.espera_max)
+            admitida = True
+            return True
+        except asyncio.TimeoutError:
+            self.expiradas[clase] += 1
+            return False
+        finally:
+            if espera in self._esperando:
+                self._esperando.remove(espera)
+                self.en_cola[clase] -= 1
+            elif not admitida and fut.done() and not fut.cancelled():
+                # _despertar ya le asignó el cupo, pero la espera expiró o la tarea se canceló
+                # (p. ej. el cliente se desconectó) en el mismo ciclo: nadie lo va a liberar.
+                self.liberar(clase)
+
+    def liberar(self, clase: str) -> None:
+        self.activos_total -= 1
+        self.activos[clase] -= 1
+        self._despertar()
+
+    def metricas(self) -> dict:
+        return {
+            "capacidad": self.capacidad,
+            "activos": self.activos_total,
+            "profundidad_cola": sum(self.en_cola.values()),
+            "clases": {
+                c: {
+                    "prioridad": cfg.prioridad,
+                    "limite": cfg.limite,
+                    "cola_max": cfg.cola,
+                    "activos": self.activos[c],
+                    "en_cola": self.en_cola[c],
+                    "admitidas": self.admitidas[c],
+                    "rechazadas": self.rechazadas[c],
+                    "expiradas": self.expiradas[c],
+                }
+                for c, cfg in self.clases.items()
+            },
+        }
+
+
+control_admision = ControlAdmision(ADMISSION_MAX_CONCURRENCY, CLASES, ADMISSION_MAX_WAIT_SECONDS)
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI: responde 503 + Retry-After en lugar de encolar sin límite."""
+
+    def __init__(self, app, control: ControlAdmision = control_admision):
+        self.app = app
+        self.control = control
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        clase = clasificar(scope["method"], scope["path"])
+        if clase is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await self.control.adquirir(clase):
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Servidor saturado, intente de nuevo en unos segundos"},
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.control.liberar(clase)
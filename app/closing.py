@@ -0,0 +1,214 @@
+"""
+Cierre diario de ventas.
+
+Valida que cada Venta.total coincida con la suma de sus DetalleVenta.subtotal y guarda
+resúmenes inmutables por día: unidades y monto por sucursal/llanta/asesor (ResumenDiario)
+y stock de cierre por sucursal/llanta (StockCierre). Todo en SQL por conjuntos y en una
+transacción. Los reportes de días cerrados leen solo estos resúmenes. Los días son del
+calendario de BUSINESS_TIMEZONE; las fechas en la BD están en UTC.
+
+    python -m app.closing              # cierra el día de ayer
+    python -m app.closing 2025-03-14
+"""
+import argparse
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from .database import BUSINESS_TIMEZONE
+from .models import CierreDiario
+
+ZONA_NEGOCIO = ZoneInfo(BUSINESS_TIMEZONE)
+
+TOLERANCIA_TOTAL = 0.005
+
+SQL_RECLAMAR = text("""
+    INSERT INTO cierrediario (fecha, cerrado_en, ventas, unidades, total)
+    VALUES (:fecha, :ahora, 0, 0, 0)
+    ON CONFLICT (fecha) DO NOTHING
+    RETURNING fecha
+""")
+
+SQL_VALIDAR = text("""
+    SELECT v.id, v.total, COALESCE(SUM(d.subtotal), 0) AS suma_detalle
+    FROM venta v
+    LEFT JOIN detalleventa d ON d.venta_id = v.id AND d.fecha = v.fecha
+    WHERE v.fecha >= :inicio AND v.fecha < :fin
+    GROUP BY v.id, v.total
+    HAVING ABS(v.total - COALESCE(SUM(d.subtotal), 0)) > :tolerancia
+    ORDER BY v.id
+""")
+
+SQL_RESUMEN = text("""
+    INSERT INTO resumendiario (fecha, sucursal_id, llanta_id, asesor_id, unidades, monto)
+    SELECT :fecha, v.sucursal_id, d.llanta_id, v.asesor_id, SUM(d.cantidad), SUM(d.subtotal)
+    FROM venta v
+    JOIN detalleventa d ON d.venta_id = v.id AND d.fecha = v.fecha
+    WHERE v.fecha >= :inicio AND v.fecha < :fin
+    GROUP BY v.sucursal_id, d.llanta_id, v.asesor_id
+""")
+
+# Stock al cierre = stock actual deshaciendo todo lo registrado después del día: se suman
+# las ventas y salidas por transferencia posteriores y se restan las entradas y los
+# ajustes/conteos (MovimientoInventario). Toda escritura de stock deja uno de estos registros.
+SQL_STOCK = text("""
+    WITH vendidas AS (
+        SELECT v.sucursal_id, d.llanta_id, SUM(d.cantidad) AS q
+        FROM venta v
+        JOIN detalleventa d ON d.venta_id = v.id AND d.fecha = v.fecha
+        WHERE v.fecha >= :fin
+        GROUP BY v.sucursal_id, d.llanta_id
+    ),
+    salidas AS (
+        SELECT origen_id AS sucursal_id, llanta_id, SUM(cantidad) AS q
+        FROM transferencia WHERE fecha >= :fin
+        GROUP BY origen_id, llanta_id
+    ),
+    entradas AS (
+        SELECT destino_id AS sucursal_id, llanta_id, SUM(cantidad) AS q
+        FROM transferencia WHERE fecha >= :fin
+        GROUP BY destino_id, llanta_id
+    ),
+    movimientos AS (
+        SELECT sucursal_id, llanta_id, SUM(delta) AS q
+        FROM movimientoinventario WHERE fecha >= :fin
+        GROUP BY sucursal_id, llanta_id
+    )
+    INSERT INTO stockcierre (fecha, sucursal_id, llanta_id, cantidad)
+    SELECT :fecha, i.sucursal_id, i.llanta_id,
+           i.cantidad_disponible + COALESCE(vd.q, 0) + COALESCE(s.q, 0) - COALESCE(e.q, 0) - COALESCE(m.q, 0)
+    FROM inventario i
+    LEFT JOIN vendidas vd ON vd.sucursal_id = i.sucursal_id AND vd.llanta_id = i.llanta_id
+    LEFT JOIN salidas s ON s.sucursal_id = i.sucursal_id AND s.llanta_id = i.llanta_id
+    LEFT JOIN entradas e ON e.sucursal_id = i.sucursal_id AND e.llanta_id = i.llanta_id
+    LEFT JOIN movimientos m ON m.sucursal_id = i.sucursal_id AND m.llanta_id = i.llanta_id
+""")
+
+SQL_TOTALES = text("""
+    UPDATE cierrediario c
+    SET ventas = t.ventas, unidades = t.unidades, total = t.total
+    FROM (
+        SELECT COUNT(*) AS ventas, COALESCE(SUM(v.total), 0) AS total,
+               (SELECT COALESCE(SUM(unidades), 0) FROM resumendiario WHERE fecha = :fecha) AS unidades
+        FROM venta v
+        WHERE v.fecha >= :inicio AND v.fecha < :fin
+    ) t
+    WHERE c.fecha = :fecha
+""")
+
+
+class CierreError(Exception):
+    pass
+
+
+def _a_utc(momento: datetime) -> datetime:
+    return momento.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _rango(fecha: date):
+    """[inicio, fin) del día `fecha` en la zona del negocio, en UTC sin tzinfo como las columnas."""
+    inicio = datetime.combine(fecha, time.min, tzinfo=ZONA_NEGOCIO)
+    fin = datetime.combine(fecha + timedelta(days=1), time.min, tzinfo=ZONA_NEGOCIO)
+    return _a_utc(inicio), _a_utc(fin)
+
+
+def hoy_negocio() -> date:
+    return datetime.now(ZONA_NEGOCIO).date()
+
+
+def cerrar_dia(session: Session, fecha: date) -> CierreDiario:
+    """
+    Cierra `fecha` (día de BUSINESS_TIMEZONE). Si ya estaba cerrada devuelve el cierre
+    existente sin tocarlo, así que volver a ejecutarlo es seguro; dos cierres concurrentes
+    del mismo día se serializan en la llave primaria de cierrediario.
+    """
+    if fecha >= hoy_negocio():
+        raise CierreError("Solo se pueden cerrar días que ya terminaron")
+
+    inicio, fin = _rango(fecha)
+    params = {"fecha": fecha, "inicio": inicio, "fin": fin}
+
+    if session.exec(SQL_RECLAMAR, params={"fecha": fecha, "ahora": datetime.utcnow()}).first() is None:
+        session.rollback()
+        return session.get(CierreDiario, fecha)
+
+    descuadradas = session.exec(SQL_VALIDAR, params={**params, "tolerancia": TOLERANCIA_TOTAL}).all()
+    if descuadradas:
+        session.rollback()
+        detalle = ", ".join(f"#{v.id} (total {v.total} vs detalle {v.suma_detalle})" for v in descuadradas[:20])
+        raise CierreError(f"{len(descuadradas)} ventas con total distinto a la suma de su detalle: {detalle}")
+
+    session.exec(SQL_RESUMEN, params=params)
+    session.exec(SQL_STOCK, params={"fecha": fecha, "fin": fin})
+    session.exec(SQL_TOTALES, params=params)
+    session.commit()
+    return session.get(CierreDiario, fecha)
+
+
+def reporte_ventas_diarias(session: Session, *, desde: date, hasta: date,
+                           sucursal_id: Optional[int] = None) -> List[Dict]:
+    """
+    Unidades y monto por día en [desde, hasta]. Los días cerrados se leen de ResumenDiario;
+    solo los días abiertos se agregan desde venta/detalleventa.
+    """
+    cerrados = set(session.exec(
+        select(CierreDiario.fecha).where(CierreDiario.fecha >= desde).where(CierreDiario.fecha <= hasta)
+    ).all())
+    filtro_sucursal = "AND sucursal_id = :sucursal_id" if sucursal_id is not None else ""
+    params = {"desde": desde, "hasta": hasta, "sucursal_id": sucursal_id}
+
+    filas = []
+    if cerrados:
+        filas += session.exec(text(f"""
+            SELECT fecha AS dia, SUM(unidades) AS unidades, SUM(monto) AS monto, TRUE AS cerrado
+            FROM resumendiario
+            WHERE fecha >= :desde AND fecha <= :hasta {filtro_sucursal}
+            GROUP BY fecha
+        """), params=params).all()
+
+    abiertos = [d for d in (desde + timedelta(days=i) for i in range((hasta - desde).days + 1))
+                if d not in cerrados]
+    if abiertos:
+        # Se recorre del primer al último día abierto (poda de particiones por fecha)
+        filtro_venta = filtro_sucursal.replace("sucursal_id", "v.sucursal_id")
+        filas += session.exec(text(f"""
+            SELECT CAST(v.fecha AT TIME ZONE 'UTC' AT TIME ZONE :zona AS date) AS dia,
+                   SUM(d.cantidad) AS unidades, SUM(d.subtotal) AS monto, FALSE AS cerrado
+            FROM venta v
+            JOIN detalleventa d ON d.venta_id = v.id AND d.fecha = v.fecha
+            WHERE v.fecha >= :inicio AND v.fecha < :fin {filtro_venta}
+            GROUP BY 1
+        """), params={**params, "inicio": _rango(min(abiertos))[0], "fin": _rango(max(abiertos))[1],
+                      "zona": BUSINESS_TIMEZONE}).all()
+        filas = [f for f in filas if f.cerrado or f.dia not in cerrados]
+
+    return [
+        {"fecha": f.dia.isoformat(), "cerrado": f.cerrado,
+         "unidades": int(f.unidades or 0), "monto": float(f.monto or 0)}
+        for f in sorted(filas, key=lambda f: f.dia)
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from .database import engine
+
+    parser = argparse.ArgumentParser(description="Cierre diario de ventas")
+    parser.add_argument("fecha", nargs="?", type=date.fromisoformat,
+                        default=hoy_negocio() - timedelta(days=1))
+    args = parser.parse_args(argv)
+
+    with Session(engine) as session:
+        try:
+            cierre = cerrar_dia(session, args.fecha)
+        except CierreError as e:
+            print(f"❌ {e}")
+            raise SystemExit(1)
+    print(f"✅ Día {cierre.fecha} cerrado: {cierre.ventas} ventas, "
+          f"{cierre.unidades} unidades, total {cierre.total:,.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -21,26 +21,43 @@ def get_database_url() -> str:
 
 
 DATABASE_URL = get_database_url()
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Zona horaria del negocio: define los días de cierre y reportes (las fechas se guardan en UTC)
+BUSINESS_TIMEZONE = os.getenv("BUSINESS_TIMEZONE", "America/Bogota")
 
 # Configuración del engine PostgreSQL
 engine = create_engine(
     DATABASE_URL,
     echo=False,
     poolclass=QueuePool,
-    pool_size=5,
-    max_overflow=10,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
     pool_pre_ping=True,
     pool_recycle=3600,
     connect_args={
-        "options": "-c timezone=America/Bogota"
+        "options": f"-c timezone={BUSINESS_TIMEZONE}"
     }
 )
 
 
 def init_db():
     """Crea todas las tablas en la base de datos"""
+    from .partitions import VENTAS_PARTICIONADAS, INVENTARIO_PARTICIONADO, crear_esquema_particionado
+    from .migrations import migrar_esquema
+    from .services import crear_sucursal_principal
+
     try:
-        SQLModel.metadata.create_all(engine)
+        if VENTAS_PARTICIONADAS or INVENTARIO_PARTICIONADO:
+            crear_esquema_particionado()
+        else:
+            SQLModel.metadata.create_all(engine)
+        # create_all no altera tablas existentes: una base anterior se pone al día aquí
+        aplicados = migrar_esquema()
+        if aplicados:
+            print(f"✅ Migración aplicada: {'; '.join(aplicados)}")
+        with Session(engine) as session:
+            crear_sucursal_principal(session)
         print("✅ Tablas creadas exitosamente")
         return True
     except Exception as e:
@@ -48,6 +65,18 @@ def init_db():
         return False
 
 
+def abrir_pool() -> None:
+    """Abre las DB_POOL_SIZE conexiones base del pool para que las primeras solicitudes no paguen la conexión"""
+    conexiones = [engine.connect() for _ in range(DB_POOL_SIZE)]
+    for conn in conexiones:
+        conn.close()
+
+
+def cerrar_pool() -> None:
+    """Cierra todas las conexiones del pool (al apagar el worker)"""
+    engine.dispose()
+
+
 def get_session() -> Generator[Session, None, None]:
     """Generador de sesiones de base de datos"""
     with Session(engine) as session:
@@ -0,0 +1,180 @@
+"""
+Sugerencias de reorden por llanta a partir del histórico de DetalleVenta.
+
+La demanda de todo el catálogo se calcula con operaciones vectorizadas sobre una
+matriz llantas x días obtenida en una sola consulta agregada.
+"""
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, text
+from sqlmodel import Session, select
+
+from .closing import _rango, hoy_negocio
+from .database import BUSINESS_TIMEZONE
+from .models import Inventario, Llanta, Venta
+
+PRONOSTICO_DIAS_HISTORIA = int(os.getenv("PRONOSTICO_DIAS_HISTORIA", "180"))
+PRONOSTICO_LEAD_TIME_DIAS = int(os.getenv("PRONOSTICO_LEAD_TIME_DIAS", "7"))
+PRONOSTICO_DIAS_COBERTURA = int(os.getenv("PRONOSTICO_DIAS_COBERTURA", "30"))
+PRONOSTICO_NIVEL_SERVICIO_Z = float(os.getenv("PRONOSTICO_NIVEL_SERVICIO_Z", "1.65"))  # ~95 %
+PRONOSTICO_MAX_DIAS = 365  # tope de lead_time y dias_cobertura aceptados
+PRONOSTICO_CACHE_MAX = int(os.getenv("PRONOSTICO_CACHE_MAX", "64"))
+
+# La demanda solo cambia cuando entran ventas: se cachea por (última venta, día, parámetros),
+# como LRU de a lo sumo PRONOSTICO_CACHE_MAX entradas. El stock sí se lee en cada consulta.
+_cache_lock = threading.Lock()
+_cache_demanda: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+
+# Unidades por llanta y día de BUSINESS_TIMEZONE (las fechas en la BD están en UTC)
+SQL_VENTAS_POR_DIA = text("""
+    SELECT d.llanta_id, CAST(d.fecha AT TIME ZONE 'UTC' AT TIME ZONE :zona AS date) AS dia,
+           SUM(d.cantidad) AS unidades
+    FROM detalleventa d
+    JOIN venta v ON v.id = d.venta_id AND v.fecha = d.fecha
+    WHERE v.sucursal_id = :sucursal_id AND d.fecha >= :desde AND d.fecha < :hasta
+    GROUP BY 1, 2
+""")
+
+SQL_UMBRALES = text("""
+    UPDATE inventario AS i
+    SET umbral_minimo = u.umbral
+    FROM unnest(CAST(:llanta_ids AS integer[]),
+                CAST(:umbrales AS integer[])) AS u (llanta_id, umbral)
+    WHERE i.sucursal_id = :sucursal_id AND i.llanta_id = u.llanta_id
+""")
+
+
+def calcular_demanda(ventas: pd.DataFrame, *, hoy: date, dias_historia: int,
+                     lead_time: int, z: float) -> pd.DataFrame:
+    """
+    `ventas` trae columnas llanta_id, dia, unidades (una fila por llanta y día con ventas).
+    Retorna por llanta_id:
+    - velocidad_diaria: unidades/día promedio en la ventana.
+    - factor_estacional: peso de los próximos `lead_time` días según el patrón por día de semana.
+    - demanda_lead_time y stock_seguridad (z·σ·√L).
+    """
+    if lead_time < 1 or dias_historia < 1:
+        raise ValueError("lead_time y dias_historia deben ser al menos 1")
+    columnas = ["velocidad_diaria", "factor_estacional", "demanda_lead_time", "stock_seguridad"]
+    if ventas.empty:
+        return pd.DataFrame({c: pd.Series(dtype=float) for c in columnas},
+                            index=pd.Index([], dtype="int64", name="llanta_id"))
+
+    fin = pd.Timestamp(hoy)
+    dias = pd.date_range(end=fin - pd.Timedelta(days=1), periods=dias_historia, freq="D")
+    llantas = pd.Index(ventas["llanta_id"].unique(), name="llanta_id")
+
+    matriz = np.zeros((len(llantas), len(dias)))
+    fila = llantas.get_indexer(ventas["llanta_id"])
+    columna = dias.get_indexer(pd.to_datetime(ventas["dia"]))
+    validos = columna >= 0
+    np.add.at(matriz, (fila[validos], columna[validos]), ventas["unidades"].to_numpy()[validos])
+
+    velocidad = matriz.mean(axis=1)
+    desviacion = matriz.std(axis=1)
+
+    # Índice por día de la semana (llantas x 7): promedio del día / promedio global
+    dow = dias.dayofweek.to_numpy()
+    por_dow = np.stack([matriz[:, dow == d].mean(axis=1) for d in range(7)], axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        indice = np.where(velocidad[:, None] > 0, por_dow / velocidad[:, None], 1.0)
+
+    proximos_dow = (fin.dayofweek + np.arange(lead_time)) % 7
+    factor = indice[:, proximos_dow].mean(axis=1)
+
+    return pd.DataFrame({
+        "velocidad_diaria": velocidad,
+        "factor_estacional": factor,
+        "demanda_lead_time": velocidad * lead_time * factor,
+        "stock_seguridad": z * desviacion * np.sqrt(lead_time),
+    }, index=llantas)
+
+
+def _demanda_cacheada(session: Session, *, sucursal_id: int, dias_historia: int,
+                      lead_time: int, z: float) -> pd.DataFrame:
+    hoy = hoy_negocio()
+    ultima_venta = session.exec(select(func.max(Venta.id))).one()
+    clave = (ultima_venta, hoy, sucursal_id, dias_historia, lead_time, z)
+    with _cache_lock:
+        if clave in _cache_demanda:
+            _cache_demanda.move_to_end(clave)
+            return _cache_demanda[clave]
+
+    # Ventana de días completos del negocio: [hoy - dias_historia, hoy)
+    filas = session.exec(SQL_VENTAS_POR_DIA, params={
+        "zona": BUSINESS_TIMEZONE,
+        "sucursal_id": sucursal_id,
+        "desde": _rango(hoy - timedelta(days=dias_historia))[0],
+        "hasta": _rango(hoy)[0],
+    }).all()
+    ventas = pd.DataFrame(filas, columns=["llanta_id", "dia", "unidades"])
+    demanda = calcular_demanda(ventas, hoy=hoy, dias_historia=dias_historia, lead_time=lead_time, z=z)
+
+    with _cache_lock:
+        # Cualquier venta nueva invalida todo lo calculado con el histórico anterior
+        for anterior in [c for c in _cache_demanda if c[:2] != clave[:2]]:
+            del _cache_demanda[anterior]
+        _cache_demanda[clave] = demanda
+        while len(_cache_demanda) > PRONOSTICO_CACHE_MAX:
+            _cache_demanda.popitem(last=False)
+    return demanda
+
+
+def obtener_sugerencias(session: Session, *, sucursal_id: int,
+                        lead_time: int = PRONOSTICO_LEAD_TIME_DIAS,
+                        dias_cobertura: int = PRONOSTICO_DIAS_COBERTURA,
+                        dias_historia: int = PRONOSTICO_DIAS_HISTORIA,
+                        z: float = PRONOSTICO_NIVEL_SERVICIO_Z) -> List[dict]:
+    """Punto de reorden, cantidad sugerida y días de cobertura de una sucursal para todo el catálogo activo."""
+    demanda = _demanda_cacheada(session, sucursal_id=sucursal_id, dias_historia=dias_historia,
+                                lead_time=lead_time, z=z)
+    filas = session.exec(
+        select(Inventario.llanta_id, Llanta.sku, Inventario.cantidad_disponible, Inventario.umbral_minimo)
+        .join(Llanta).where(Llanta.activa == True)
+        .where(Inventario.sucursal_id == sucursal_id)
+    ).all()
+    if not filas:
+        return []
+
+    catalogo = pd.DataFrame(filas, columns=["llanta_id", "sku", "cantidad_disponible", "umbral_minimo"])
+    d = demanda.reindex(catalogo["llanta_id"]).fillna(
+        {"velocidad_diaria": 0.0, "factor_estacional": 1.0, "demanda_lead_time": 0.0, "stock_seguridad": 0.0}
+    )
+    velocidad = d["velocidad_diaria"].to_numpy()
+    stock = catalogo["cantidad_disponible"].to_numpy()
+
+    punto_reorden = np.ceil(d["demanda_lead_time"].to_numpy() + d["stock_seguridad"].to_numpy()).astype(int)
+    objetivo = punto_reorden + np.ceil(velocidad * dias_cobertura).astype(int)
+    cantidad = np.where(stock <= punto_reorden, np.maximum(objetivo - stock, 0), 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cobertura = np.where(velocidad > 0, stock / velocidad, np.nan)
+
+    resultado = catalogo.assign(
+        velocidad_diaria=velocidad.round(3),
+        factor_estacional=d["factor_estacional"].to_numpy().round(3),
+        dias_cobertura=cobertura.round(1),
+        umbral_sugerido=punto_reorden,
+        cantidad_sugerida=cantidad,
+    )
+    # NaN (sin ventas en la ventana) -> None para que sea JSON válido
+    return resultado.astype(object).where(resultado.notna(), None).to_dict(orient="records")
+
+
+def aplicar_umbrales_sugeridos(session: Session, umbrales: Dict[int, int], *, sucursal_id: int) -> int:
+    """Actualiza umbral_minimo de varias llantas en un solo UPDATE. `umbrales` = {llanta_id: umbral}."""
+    if not umbrales:
+        return 0
+    ids = list(umbrales)
+    result = session.exec(SQL_UMBRALES, params={
+        "sucursal_id": sucursal_id,
+        "llanta_ids": [int(i) for i in ids],
+        "umbrales": [int(umbrales[i]) for i in ids],
+    })
+    session.commit()
+    return result.rowcount
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Callable, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, delete, select, update
+
+from .database import engine
+from .models import ClaveIdempotencia
+
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "35"))
+
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+class IdempotencyError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def calcular_huella(payload: Any) -> str:
+    contenido = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def _reclamar(session: Session, clave: str, alcance: str, huella: str) -> bool:
+    """
+    Inserta la clave dentro de la transacción de la solicitud. True si esta solicitud la obtuvo.
+    Si otra transacción insertó la misma clave y no ha terminado, Postgres bloquea este INSERT
+    en el índice único hasta que ella confirme o revierta (como máximo IDEMPOTENCY_WAIT_SECONDS).
+    """
+    ahora = datetime.utcnow()
+    session.exec(text(f"SET LOCAL lock_timeout = {int(IDEMPOTENCY_WAIT_SECONDS * 1000)}"))
+    session.exec(delete(ClaveIdempotencia)
+                 .where(ClaveIdempotencia.clave == clave)
+                 .where(ClaveIdempotencia.expira < ahora))
+    stmt = (pg_insert(ClaveIdempotencia)
+            .values(clave=clave, alcance=alcance, huella=huella, estado="en_proceso",
+                    creada=ahora, expira=ahora + timedelta(hours=IDEMPOTENCY_TTL_HOURS))
+            .on_conflict_do_nothing(index_elements=["clave"]))
+    return session.exec(stmt).rowcount == 1
+
+
+def _guardar(session: Session, clave: str, status_code: int, cuerpo: Any) -> None:
+    session.exec(update(ClaveIdempotencia)
+                 .where(ClaveIdempotencia.clave == clave)
+                 .values(estado="completada", status_code=status_code,
+                         respuesta=json.dumps(cuerpo, default=str)))
+
+
+def ejecutar_idempotente(session: Session, clave: str, *, alcance: str, payload: Any,
+                         operacion: Callable[[], Tuple[int, Any]]) -> Tuple[int, Any, bool]:
+    """
+    Ejecuta `operacion` una sola vez por `clave`.
+    - `operacion` escribe en `session` sin confirmar; la clave, su respuesta y la escritura de
+      negocio se confirman en un solo commit, así que no existe una venta sin respuesta guardada.
+    - Duplicados concurrentes quedan bloqueados en el INSERT de la clave hasta que la primera
+      termine y luego devuelven su resultado, sin sondear la BD.
+    - Repeticiones posteriores devuelven la respuesta guardada sin volver a ejecutar.
+    - Si la operación responde con error (>= 400) se revierte todo, incluida la clave: no hubo
+      efectos y un reintento vuelve a ejecutarse.
+    Retorna (status_code, cuerpo, repetida).
+    """
+    huella = calcular_huella(payload)
+
+    try:
+        reclamada = _reclamar(session, clave, alcance, huella)
+    except OperationalError as e:
+        session.rollback()
+        if getattr(e.orig, "pgcode", None) == LOCK_NOT_AVAILABLE:
+            raise IdempotencyError(409, "Una solicitud con esta Idempotency-Key sigue en proceso")
+        raise
+
+    if not reclamada:
+        registro = session.exec(
+            select(ClaveIdempotencia.alcance, ClaveIdempotencia.huella, ClaveIdempotencia.estado,
+                   ClaveIdempotencia.status_code, ClaveIdempotencia.respuesta)
+            .where(ClaveIdempotencia.clave == clave)
+        ).first()
+        session.rollback()
+        if registro is None:
+            raise IdempotencyError(409, "La Idempotency-Key cambió mientras se procesaba; reintente")
+        if registro.alcance != alcance or registro.huella != huella:
+            raise IdempotencyError(422, "La Idempotency-Key ya se usó con una solicitud diferente")
+        if registro.estado != "completada":
+            # Solo puede venir de una versión anterior que confirmaba la clave por separado:
+            # no se sabe si la operación se aplicó, así que nunca se libera automáticamente
+            raise IdempotencyError(409, "El resultado de esta Idempotency-Key es desconocido")
+        return registro.status_code, json.loads(registro.respuesta), True
+
+    try:
+        status_code, cuerpo = operacion()
+        if status_code >= 400:
+            session.rollback()
+            return status_code, cuerpo, False
+        _guardar(session, clave, status_code, cuerpo)
+        session.commit()
+    except BaseException:
+        session.rollback()
+        raise
+    return status_code, cuerpo, False
+
+
+def purgar_claves_expiradas() -> int:
+    """Elimina las claves cuyo TTL ya venció. Retorna cuántas se borraron."""
+    with Session(engine) as session:
+        result = session.exec(delete(ClaveIdempotencia)
+                              .where(ClaveIdempotencia.expira < datetime.utcnow()))
+        session.commit()
+        return result.rowcount
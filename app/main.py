@@ -1,35 +1,89 @@
-from fastapi import FastAPI, Depends, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Header, Query
+from fastapi.responses import JSONResponse
 from sqlmodel import Session, select
-from typing import List
+from typing import List, Optional, Callable, Tuple, Any
+from datetime import date, datetime
 import os
 
 # Importar tus módulos
-from .database import get_session, init_db, test_connection
-from .models import Llanta, Cliente, Asesor, Venta, Inventario, DetalleVenta
+from .database import get_session, init_db, test_connection, abrir_pool, cerrar_pool
+from .models import Llanta, Cliente, Asesor, Venta, Inventario, DetalleVenta, HistorialPrecio, Sucursal
 from .schemas import (
     LlantaIn, LlantaRead, ClienteIn, ClienteRead,
     AsesorIn, AsesorRead, VentaIn, VentaRead,
-    AjusteInventarioIn, InventarioRead
+    AjusteInventarioIn, InventarioRead, AplicarSugerenciasIn,
+    CambioPrecioIn, CambioPrecioRead, HistorialPrecioRead, ConteoIn,
+    SucursalIn, SucursalRead, TransferenciaIn, TransferenciaRead
 )
-from .services import crear_llanta_con_inventario, ajustar_inventario, crear_venta, StockError
-
-app = FastAPI(
-    title="🚗 Serviteca Llantas API",
-    description="API para gestión de inventario y ventas de llantas",
-    version="1.0.0"
+from .services import (
+    crear_llanta_con_inventario, ajustar_inventario, crear_venta, StockError,
+    programar_cambio_precio, PrecioError, aplicar_conteo,
+    crear_sucursal, transferir_stock, disponibilidad_por_sucursal, SUCURSAL_PRINCIPAL_ID
+)
+from .idempotency import ejecutar_idempotente, IdempotencyError
+from .admission import AdmissionMiddleware, control_admision
+from .profiling import PROFILING_ENABLED, instalar_perfilado
+from .closing import cerrar_dia, reporte_ventas_diarias, CierreError
+from .forecast import (
+    obtener_sugerencias, aplicar_umbrales_sugeridos,
+    PRONOSTICO_LEAD_TIME_DIAS, PRONOSTICO_DIAS_COBERTURA, PRONOSTICO_MAX_DIAS
 )
 
 
-@app.on_event("startup")
-async def startup_event():
-    print("🚀 Iniciando Serviteca Llantas API...")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    print(f"🚀 Iniciando Serviteca Llantas API (worker {os.getpid()})...")
 
     if not test_connection():
         print("⚠️ Problema de conexión a BD, pero continuando...")
 
-    if init_db():
+    # Con app.server las tablas ya las creó el proceso principal antes de lanzar los workers
+    if os.getenv("SERVITECA_DB_INICIALIZADA") != "1" and init_db():
         print("✅ Base de datos lista para usar")
 
+    try:
+        abrir_pool()
+    except Exception as e:
+        print(f"⚠️ No se pudo abrir el pool de conexiones: {e}")
+
+    yield
+
+    cerrar_pool()
+    print(f"👋 Worker {os.getpid()} detenido, pool de conexiones cerrado")
+
+
+app = FastAPI(
+    title="🚗 Serviteca Llantas API",
+    description="API para gestión de inventario y ventas de llantas",
+    version="1.0.0",
+    lifespan=lifespan
+)
+if PROFILING_ENABLED:
+    instalar_perfilado(app)
+app.add_middleware(AdmissionMiddleware, control=control_admision)
+
+
+def responder_idempotente(session: Session, clave: Optional[str], *, alcance: str, payload: Any,
+                          operacion: Callable[[], Tuple[int, Any]]) -> JSONResponse:
+    """
+    Ejecuta la operación respetando el header Idempotency-Key (si viene). Con clave, la
+    operación no debe confirmar: la clave y su respuesta se confirman junto con ella.
+    """
+    repetida = False
+    if not clave:
+        status_code, cuerpo = operacion()
+    else:
+        try:
+            status_code, cuerpo, repetida = ejecutar_idempotente(
+                session, clave, alcance=alcance, payload=payload, operacion=operacion
+            )
+        except IdempotencyError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    headers = {"Idempotent-Replayed": "true"} if repetida else None
+    return JSONResponse(status_code=status_code, content=cuerpo, headers=headers)
+
 
 # ========== ENDPOINTS BÁSICOS ==========
 
@@ -39,7 +93,7 @@ def read_root():
         "message": "🚗 API Serviteca Llantas",
         "version": "1.0.0",
         "database": "PostgreSQL",
-        "endpoints": ["/llantas", "/clientes", "/asesores", "/ventas", "/inventario"]
+        "endpoints": ["/llantas", "/clientes", "/asesores", "/ventas", "/inventario", "/sucursales"]
     }
 
 
@@ -64,6 +118,12 @@ def health_check(session: Session = Depends(get_session)):
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
+@app.get("/admision/metricas")
+def metricas_admision():
+    """Profundidad de cola, solicitudes activas y rechazos del control de admisión (por worker)"""
+    return {"pid": os.getpid(), **control_admision.metricas()}
+
+
 # ========== ENDPOINTS DE LLANTAS ==========
 
 @app.post("/llantas", response_model=LlantaRead)
@@ -90,6 +150,25 @@ def listar_llantas(session: Session = Depends(get_session)):
     return llantas
 
 
+@app.post("/llantas/precios", response_model=CambioPrecioRead)
+def cambiar_precios(cambio: CambioPrecioIn, session: Session = Depends(get_session)):
+    """Cambio de precio masivo (porcentaje o valor absoluto) por marca, medida o lista de SKUs.
+    Con `efectiva_desde` futura queda programado hasta que corra `aplicar_cambios_programados`."""
+    try:
+        return programar_cambio_precio(session, **cambio.model_dump())
+    except PrecioError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/llantas/{llanta_id}/precios", response_model=List[HistorialPrecioRead])
+def historial_precios(llanta_id: int, session: Session = Depends(get_session)):
+    """Historial de cambios de precio de una llanta (más recientes primero)"""
+    query = (select(HistorialPrecio)
+             .where(HistorialPrecio.llanta_id == llanta_id)
+             .order_by(HistorialPrecio.fecha.desc()))
+    return session.exec(query).all()
+
+
 @app.get("/llantas/{llanta_id}", response_model=LlantaRead)
 def obtener_llanta(llanta_id: int, session: Session = Depends(get_session)):
     llanta = session.get(Llanta, llanta_id)
@@ -101,15 +180,18 @@ def obtener_llanta(llanta_id: int, session: Session = Depends(get_session)):
 # ========== ENDPOINTS DE INVENTARIO ==========
 
 @app.get("/inventario", response_model=List[dict])
-def listar_inventario(session: Session = Depends(get_session)):
-    """Listar inventario con información de llantas"""
-    query = select(Inventario, Llanta).join(Llanta).where(Llanta.activa == True)
+def listar_inventario(sucursal_id: int = SUCURSAL_PRINCIPAL_ID, session: Session = Depends(get_session)):
+    """Listar inventario de una sucursal con información de llantas"""
+    query = (select(Inventario, Llanta).join(Llanta)
+             .where(Llanta.activa == True)
+             .where(Inventario.sucursal_id == sucursal_id))
     results = session.exec(query).all()
 
     inventario = []
     for inv, llanta in results:
         inventario.append({
             "id": inv.id,
+            "sucursal_id": inv.sucursal_id,
             "llanta_id": llanta.id,
             "sku": llanta.sku,
             "marca": llanta.marca,
@@ -123,29 +205,126 @@ def listar_inventario(session: Session = Depends(get_session)):
     return inventario
 
 
-@app.put("/inventario/{llanta_id}/ajustar")
-def ajustar_stock(
-        llanta_id: int,
-        ajuste: AjusteInventarioIn,
+@app.post("/inventario/conteo")
+def registrar_conteo(conteo: ConteoIn, session: Session = Depends(get_session)):
+    """Conteo físico: fija las cantidades contadas (valores absolutos) y devuelve las diferencias"""
+    try:
+        return aplicar_conteo(
+            session,
+            [item.model_dump() for item in conteo.items],
+            sucursal_id=conteo.sucursal_id or SUCURSAL_PRINCIPAL_ID
+        )
+    except StockError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/inventario/sugerencias", response_model=List[dict])
+def sugerencias_reorden(
+        sucursal_id: int = SUCURSAL_PRINCIPAL_ID,
+        lead_time: int = Query(PRONOSTICO_LEAD_TIME_DIAS, ge=1, le=PRONOSTICO_MAX_DIAS),
+        dias_cobertura: int = Query(PRONOSTICO_DIAS_COBERTURA, ge=1, le=PRONOSTICO_MAX_DIAS),
         session: Session = Depends(get_session)
 ):
-    """Ajustar inventario de una llanta (positivo = entrada, negativo = salida)"""
+    """Velocidad de venta, días de cobertura y punto/cantidad de reorden sugeridos por llanta"""
+    return obtener_sugerencias(session, sucursal_id=sucursal_id,
+                               lead_time=lead_time, dias_cobertura=dias_cobertura)
+
+
+@app.post("/inventario/sugerencias/aplicar")
+def aplicar_sugerencias(datos: AplicarSugerenciasIn, session: Session = Depends(get_session)):
+    """Aplicar en bloque los umbrales mínimos sugeridos (todas las llantas o las indicadas)"""
+    sucursal_id = datos.sucursal_id or SUCURSAL_PRINCIPAL_ID
+    sugerencias = obtener_sugerencias(
+        session,
+        sucursal_id=sucursal_id,
+        lead_time=datos.lead_time or PRONOSTICO_LEAD_TIME_DIAS,
+        dias_cobertura=datos.dias_cobertura or PRONOSTICO_DIAS_COBERTURA
+    )
+    seleccion = set(datos.llanta_ids) if datos.llanta_ids is not None else None
+    umbrales = {s["llanta_id"]: s["umbral_sugerido"] for s in sugerencias
+                if seleccion is None or s["llanta_id"] in seleccion}
+    actualizadas = aplicar_umbrales_sugeridos(session, umbrales, sucursal_id=sucursal_id)
+    return {"message": f"Umbrales actualizados en {actualizadas} llantas", "actualizadas": actualizadas}
+
+
+@app.get("/inventario/disponibilidad", response_model=List[dict])
+def disponibilidad(
+        llanta_id: Optional[int] = None,
+        sku: Optional[str] = None,
+        session: Session = Depends(get_session)
+):
+    """Stock de una llanta (por id o SKU) en todas las sucursales"""
+    if llanta_id is None and sku is None:
+        raise HTTPException(status_code=400, detail="Indique llanta_id o sku")
+    return disponibilidad_por_sucursal(session, llanta_id=llanta_id, sku=sku)
+
+
+@app.post("/inventario/transferencias", response_model=List[TransferenciaRead])
+def transferir(transferencia: TransferenciaIn, session: Session = Depends(get_session)):
+    """Transferir stock entre sucursales (todo o nada)"""
     try:
-        inventario = ajustar_inventario(
+        return transferir_stock(
             session,
-            llanta_id=llanta_id,
-            delta=ajuste.delta,
-            nuevo_umbral_minimo=ajuste.umbral_minimo
+            origen_id=transferencia.origen_id,
+            destino_id=transferencia.destino_id,
+            items=[item.model_dump() for item in transferencia.items]
         )
-        return {
-            "message": f"Inventario ajustado en {ajuste.delta} unidades",
-            "nueva_cantidad": inventario.cantidad_disponible,
-            "umbral_minimo": inventario.umbral_minimo
-        }
     except StockError as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.put("/inventario/{llanta_id}/ajustar")
+def ajustar_stock(
+        llanta_id: int,
+        ajuste: AjusteInventarioIn,
+        sucursal_id: int = SUCURSAL_PRINCIPAL_ID,
+        session: Session = Depends(get_session),
+        idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")
+):
+    """Ajustar inventario de una llanta (positivo = entrada, negativo = salida)"""
+    def operacion():
+        try:
+            inventario = ajustar_inventario(
+                session,
+                llanta_id=llanta_id,
+                delta=ajuste.delta,
+                nuevo_umbral_minimo=ajuste.umbral_minimo,
+                sucursal_id=sucursal_id,
+                confirmar=not idempotency_key
+            )
+            return 200, {
+                "message": f"Inventario ajustado en {ajuste.delta} unidades",
+                "nueva_cantidad": inventario.cantidad_disponible,
+                "umbral_minimo": inventario.umbral_minimo
+            }
+        except StockError as e:
+            return 400, {"detail": str(e)}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    return responder_idempotente(
+        session,
+        idempotency_key,
+        alcance="PUT /inventario/ajustar",
+        payload={"llanta_id": llanta_id, "sucursal_id": sucursal_id, **ajuste.model_dump()},
+        operacion=operacion
+    )
+
+
+# ========== ENDPOINTS DE SUCURSALES ==========
+
+@app.post("/sucursales", response_model=SucursalRead)
+def registrar_sucursal(sucursal: SucursalIn, session: Session = Depends(get_session)):
+    """Crear sucursal con inventario en 0 para todas las llantas"""
+    try:
+        return crear_sucursal(session, nombre=sucursal.nombre, codigo=sucursal.codigo)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=400, detail=f"Error creando sucursal: {str(e)}")
+
+
+@app.get("/sucursales", response_model=List[SucursalRead])
+def listar_sucursales(session: Session = Depends(get_session)):
+    return session.exec(select(Sucursal)).all()
 
 
 # ========== ENDPOINTS DE CLIENTES ==========
@@ -189,36 +368,66 @@ def listar_asesores(session: Session = Depends(get_session)):
 # ========== ENDPOINTS DE VENTAS ==========
 
 @app.post("/ventas", response_model=dict)
-def crear_nueva_venta(venta_data: VentaIn, session: Session = Depends(get_session)):
+def crear_nueva_venta(
+        venta_data: VentaIn,
+        session: Session = Depends(get_session),
+        idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")
+):
     """Crear nueva venta y actualizar inventario automáticamente"""
-    try:
-        items = [{"llanta_id": item.llanta_id, "cantidad": item.cantidad}
-                 for item in venta_data.items]
-
-        venta = crear_venta(
-            session,
-            cliente_id=venta_data.cliente_id,
-            asesor_id=venta_data.asesor_id,
-            items=items
-        )
+    def operacion():
+        try:
+            items = [{"llanta_id": item.llanta_id, "cantidad": item.cantidad}
+                     for item in venta_data.items]
+
+            venta = crear_venta(
+                session,
+                cliente_id=venta_data.cliente_id,
+                asesor_id=venta_data.asesor_id,
+                items=items,
+                sucursal_id=venta_data.sucursal_id or SUCURSAL_PRINCIPAL_ID,
+                confirmar=not idempotency_key
+            )
+
+            return 200, {
+                "message": "Venta creada exitosamente",
+                "venta_id": venta.id,
+                "sucursal_id": venta.sucursal_id,
+                "total": venta.total,
+                "fecha": venta.fecha.isoformat(),
+                "items_vendidos": len(items)
+            }
+        except StockError as e:
+            return 400, {"detail": f"Error de stock: {str(e)}"}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error creando venta: {str(e)}")
 
-        return {
-            "message": "Venta creada exitosamente",
-            "venta_id": venta.id,
-            "total": venta.total,
-            "fecha": venta.fecha.isoformat(),
-            "items_vendidos": len(items)
-        }
-    except StockError as e:
-        raise HTTPException(status_code=400, detail=f"Error de stock: {str(e)}")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error creando venta: {str(e)}")
+    return responder_idempotente(
+        session,
+        idempotency_key,
+        alcance="POST /ventas",
+        payload=venta_data.model_dump(),
+        operacion=operacion
+    )
 
 
 @app.get("/ventas", response_model=List[dict])
-def listar_ventas(limit: int = 50, session: Session = Depends(get_session)):
-    """Listar ventas con información completa"""
-    query = select(Venta, Cliente, Asesor).join(Cliente).join(Asesor).limit(limit)
+def listar_ventas(
+        limit: int = 50,
+        desde: Optional[datetime] = None,
+        hasta: Optional[datetime] = None,
+        sucursal_id: Optional[int] = None,
+        session: Session = Depends(get_session)
+):
+    """Listar ventas con información completa (más recientes primero)"""
+    query = select(Venta, Cliente, Asesor).join(Cliente).join(Asesor)
+    if sucursal_id is not None:
+        query = query.where(Venta.sucursal_id == sucursal_id)
+    # Filtrar por fecha permite descartar particiones completas cuando la tabla está particionada
+    if desde is not None:
+        query = query.where(Venta.fecha >= desde)
+    if hasta is not None:
+        query = query.where(Venta.fecha < hasta)
+    query = query.order_by(Venta.fecha.desc()).limit(limit)
     results = session.exec(query).all()
 
     ventas = []
@@ -226,22 +435,54 @@ def listar_ventas(limit: int = 50, session: Session = Depends(get_session)):
         ventas.append({
             "id": venta.id,
             "fecha": venta.fecha.isoformat(),
+            "sucursal_id": venta.sucursal_id,
             "total": venta.total,
             "cliente": cliente.nombre,
             "asesor": asesor.nombre
         })
 
-    return sorted(ventas, key=lambda x: x["fecha"], reverse=True)
+    return ventas
+
+
+@app.post("/cierres/{fecha}")
+def cerrar_ventas_dia(fecha: date, session: Session = Depends(get_session)):
+    """Cerrar un día de ventas (idempotente: si ya estaba cerrado devuelve el cierre existente)"""
+    try:
+        return cerrar_dia(session, fecha)
+    except CierreError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/reportes/ventas-diarias", response_model=List[dict])
+def reporte_diario(
+        desde: date,
+        hasta: date,
+        sucursal_id: Optional[int] = None,
+        session: Session = Depends(get_session)
+):
+    """Unidades y monto por día; los días cerrados se leen de los resúmenes del cierre"""
+    if hasta < desde:
+        raise HTTPException(status_code=400, detail="'hasta' debe ser posterior a 'desde'")
+    return reporte_ventas_diarias(session, desde=desde, hasta=hasta, sucursal_id=sucursal_id)
 
 
 @app.get("/ventas/{venta_id}/detalle")
-def obtener_detalle_venta(venta_id: int, session: Session = Depends(get_session)):
-    """Obtener detalle completo de una venta"""
-    venta = session.get(Venta, venta_id)
+def obtener_detalle_venta(venta_id: int, fecha: Optional[datetime] = None,
+                          session: Session = Depends(get_session)):
+    """
+    Obtener detalle completo de una venta. Con `fecha` (la que retorna GET /ventas) la
+    búsqueda va a una sola partición; sin ella se revisan todas.
+    """
+    query = select(Venta).where(Venta.id == venta_id)
+    if fecha is not None:
+        query = query.where(Venta.fecha == fecha)
+    venta = session.exec(query).first()
     if not venta:
         raise HTTPException(status_code=404, detail="Venta no encontrada")
 
-    query = select(DetalleVenta, Llanta).join(Llanta).where(DetalleVenta.venta_id == venta_id)
+    query = (select(DetalleVenta, Llanta).join(Llanta)
+             .where(DetalleVenta.venta_id == venta_id)
+             .where(DetalleVenta.fecha == venta.fecha))
     detalles = session.exec(query).all()
 
     items = []
@@ -259,12 +500,13 @@ def obtener_detalle_venta(venta_id: int, session: Session = Depends(get_session)
     return {
         "venta_id": venta.id,
         "fecha": venta.fecha.isoformat(),
+        "sucursal_id": venta.sucursal_id,
         "total": venta.total,
         "items": items
     }
 
 
 if __name__ == "__main__":
-    import uvicorn
+    from .server import main
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    main()
\ No newline at end of file
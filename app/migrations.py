@@ -0,0 +1,117 @@
+"""
+Migración de una base existente (creada antes de sucursales y particionado) al esquema actual.
+
+`create_all` crea las tablas que faltan pero nunca altera las existentes; esto agrega las
+columnas nuevas a `inventario`, `venta` y `detalleventa`, las llena y cambia la restricción
+única del inventario. Es idempotente: cada paso revisa el catálogo antes de ejecutarse, así
+que en una base al día no hace nada. init_db() lo ejecuta al arrancar.
+
+    python -m app.migrations
+"""
+from typing import List
+
+from sqlalchemy import text
+
+from .database import engine
+
+
+def _columna_existe(conn, tabla: str, columna: str) -> bool:
+    return conn.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = :tabla AND column_name = :columna
+        )
+    """), {"tabla": tabla, "columna": columna}).scalar()
+
+
+def _asegurar_sucursal_principal(conn, sucursal_id: int) -> None:
+    """Las filas existentes pasan a la sucursal principal; debe existir antes de la llave foránea."""
+    conn.execute(text("""
+        INSERT INTO sucursal (id, nombre, codigo, activa)
+        VALUES (:id, 'Principal', 'PRINCIPAL', TRUE)
+        ON CONFLICT DO NOTHING
+    """), {"id": sucursal_id})
+    conn.execute(text(
+        "SELECT setval(pg_get_serial_sequence('sucursal', 'id'), GREATEST((SELECT MAX(id) FROM sucursal), 1))"
+    ))
+
+
+def _agregar_sucursal_id(conn, tabla: str, sucursal_id: int) -> None:
+    # Con DEFAULT constante Postgres no reescribe la tabla: las filas existentes quedan en la principal
+    conn.execute(text(
+        f"ALTER TABLE {tabla} ADD COLUMN sucursal_id INTEGER NOT NULL DEFAULT {int(sucursal_id)}"
+    ))
+    conn.execute(text(f"ALTER TABLE {tabla} ALTER COLUMN sucursal_id DROP DEFAULT"))
+    conn.execute(text(
+        f"ALTER TABLE {tabla} ADD CONSTRAINT {tabla}_sucursal_id_fkey "
+        f"FOREIGN KEY (sucursal_id) REFERENCES sucursal (id)"
+    ))
+
+
+def _quitar_unico_llanta(conn) -> None:
+    """Antes una llanta tenía un solo inventario (UNIQUE (llanta_id)); ahora es uno por sucursal."""
+    restricciones = conn.execute(text("""
+        SELECT c.conname
+        FROM pg_constraint c
+        JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1]
+        WHERE c.conrelid = CAST('inventario' AS regclass)
+          AND c.contype = 'u'
+          AND array_length(c.conkey, 1) = 1
+          AND a.attname = 'llanta_id'
+    """)).scalars().all()
+    for conname in restricciones:
+        conn.execute(text(f'ALTER TABLE inventario DROP CONSTRAINT "{conname}"'))
+
+
+def migrar_esquema() -> List[str]:
+    """Aplica en una sola transacción los pasos pendientes. Retorna la descripción de los aplicados."""
+    from .services import SUCURSAL_PRINCIPAL_ID
+
+    aplicados = []
+    with engine.begin() as conn:
+        if not _columna_existe(conn, "inventario", "sucursal_id"):
+            _asegurar_sucursal_principal(conn, SUCURSAL_PRINCIPAL_ID)
+            _agregar_sucursal_id(conn, "inventario", SUCURSAL_PRINCIPAL_ID)
+            _quitar_unico_llanta(conn)
+            conn.execute(text(
+                "ALTER TABLE inventario ADD CONSTRAINT inventario_sucursal_id_llanta_id_key "
+                "UNIQUE (sucursal_id, llanta_id)"
+            ))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_inventario_llanta_id ON inventario (llanta_id)"))
+            aplicados.append("inventario.sucursal_id y UNIQUE (sucursal_id, llanta_id)")
+
+        if not _columna_existe(conn, "venta", "sucursal_id"):
+            _asegurar_sucursal_principal(conn, SUCURSAL_PRINCIPAL_ID)
+            _agregar_sucursal_id(conn, "venta", SUCURSAL_PRINCIPAL_ID)
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_venta_sucursal_fecha ON venta (sucursal_id, fecha)"
+            ))
+            aplicados.append("venta.sucursal_id")
+
+        if not _columna_existe(conn, "detalleventa", "fecha"):
+            conn.execute(text("ALTER TABLE detalleventa ADD COLUMN fecha TIMESTAMP WITHOUT TIME ZONE"))
+            conn.execute(text(
+                "UPDATE detalleventa d SET fecha = v.fecha FROM venta v WHERE v.id = d.venta_id"
+            ))
+            conn.execute(text("ALTER TABLE detalleventa ALTER COLUMN fecha SET NOT NULL"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_detalleventa_venta_id ON detalleventa (venta_id)"
+            ))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_venta_fecha ON venta (fecha)"))
+            aplicados.append("detalleventa.fecha copiada de venta")
+    return aplicados
+
+
+def main() -> None:
+    from sqlmodel import SQLModel
+
+    SQLModel.metadata.create_all(engine)  # tablas nuevas (sucursal, transferencia, ...)
+    aplicados = migrar_esquema()
+    if aplicados:
+        print("✅ Migración aplicada: " + "; ".join(aplicados))
+    else:
+        print("✅ El esquema ya estaba al día")
+
+
+if __name__ == "__main__":
+    main()
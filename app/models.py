@@ -1,8 +1,16 @@
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime
+from sqlalchemy import Index, UniqueConstraint
 from sqlmodel import SQLModel, Field, Relationship
 
 
+class Sucursal(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    nombre: str
+    codigo: str = Field(index=True, unique=True)
+    activa: bool = True
+
+
 class Llanta(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     sku: str = Field(index=True, unique=True)
@@ -11,15 +19,17 @@ class Llanta(SQLModel, table=True):
     medida: str
     precio_venta: float
     activa: bool = True
-    inventario: Optional["Inventario"] = Relationship(back_populates="llanta")
+    inventarios: List["Inventario"] = Relationship(back_populates="llanta")
 
 
 class Inventario(SQLModel, table=True):
+    __table_args__ = (UniqueConstraint("sucursal_id", "llanta_id"),)
     id: Optional[int] = Field(default=None, primary_key=True)
-    llanta_id: int = Field(foreign_key="llanta.id", unique=True)
+    sucursal_id: int = Field(foreign_key="sucursal.id")
+    llanta_id: int = Field(foreign_key="llanta.id", index=True)
     cantidad_disponible: int
     umbral_minimo: int = 0
-    llanta: Llanta = Relationship(back_populates="inventario")
+    llanta: Llanta = Relationship(back_populates="inventarios")
 
 
 class Cliente(SQLModel, table=True):
@@ -38,8 +48,10 @@ class Asesor(SQLModel, table=True):
 
 
 class Venta(SQLModel, table=True):
+    __table_args__ = (Index("ix_venta_sucursal_fecha", "sucursal_id", "fecha"),)
     id: Optional[int] = Field(default=None, primary_key=True)
-    fecha: datetime = Field(default_factory=datetime.utcnow)
+    fecha: datetime = Field(default_factory=datetime.utcnow, index=True)
+    sucursal_id: int = Field(foreign_key="sucursal.id")
     cliente_id: int = Field(foreign_key="cliente.id")
     asesor_id: int = Field(foreign_key="asesor.id")
     total: float = 0.0
@@ -48,9 +60,87 @@ class Venta(SQLModel, table=True):
 
 class DetalleVenta(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    venta_id: int = Field(foreign_key="venta.id")
+    venta_id: int = Field(foreign_key="venta.id", index=True)
+    fecha: datetime = Field(default_factory=datetime.utcnow)  # copia de Venta.fecha (clave de partición)
     llanta_id: int = Field(foreign_key="llanta.id")
     cantidad: int
     precio_unitario: float
     subtotal: float
     venta: Venta = Relationship(back_populates="detalles")
+
+
+class CambioPrecio(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tipo: str  # "porcentaje" | "absoluto"
+    valor: float
+    marca: Optional[str] = None
+    medida: Optional[str] = None
+    skus: Optional[str] = None  # lista JSON de SKUs
+    efectiva_desde: datetime = Field(default_factory=datetime.utcnow, index=True)
+    estado: str = Field(default="pendiente", index=True)  # pendiente | aplicando | aplicado
+    creado: datetime = Field(default_factory=datetime.utcnow)
+    aplicado_en: Optional[datetime] = None
+    llantas_afectadas: int = 0
+
+
+class HistorialPrecio(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    llanta_id: int = Field(foreign_key="llanta.id", index=True)
+    cambio_id: Optional[int] = Field(default=None, foreign_key="cambioprecio.id", index=True)
+    precio_anterior: float
+    precio_nuevo: float
+    fecha: datetime = Field(default_factory=datetime.utcnow)
+
+
+class Transferencia(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    fecha: datetime = Field(default_factory=datetime.utcnow, index=True)
+    origen_id: int = Field(foreign_key="sucursal.id")
+    destino_id: int = Field(foreign_key="sucursal.id")
+    llanta_id: int = Field(foreign_key="llanta.id")
+    cantidad: int
+
+
+class MovimientoInventario(SQLModel, table=True):
+    """Cambios de stock que no quedan en ventas ni transferencias: ajustes manuales y conteos."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    fecha: datetime = Field(default_factory=datetime.utcnow, index=True)
+    sucursal_id: int = Field(foreign_key="sucursal.id")
+    llanta_id: int = Field(foreign_key="llanta.id")
+    tipo: str  # ajuste | conteo
+    delta: int
+
+
+class CierreDiario(SQLModel, table=True):
+    fecha: date = Field(primary_key=True)
+    cerrado_en: datetime = Field(default_factory=datetime.utcnow)
+    ventas: int = 0
+    unidades: int = 0
+    total: float = 0.0
+
+
+class ResumenDiario(SQLModel, table=True):
+    fecha: date = Field(primary_key=True)
+    sucursal_id: int = Field(primary_key=True, foreign_key="sucursal.id")
+    llanta_id: int = Field(primary_key=True, foreign_key="llanta.id")
+    asesor_id: int = Field(primary_key=True, foreign_key="asesor.id")
+    unidades: int
+    monto: float
+
+
+class StockCierre(SQLModel, table=True):
+    fecha: date = Field(primary_key=True)
+    sucursal_id: int = Field(primary_key=True, foreign_key="sucursal.id")
+    llanta_id: int = Field(primary_key=True, foreign_key="llanta.id")
+    cantidad: int
+
+
+class ClaveIdempotencia(SQLModel, table=True):
+    clave: str = Field(primary_key=True, max_length=255)
+    alcance: str
+    huella: str
+    estado: str = "en_proceso"
+    status_code: Optional[int] = None
+    respuesta: Optional[str] = None
+    creada: datetime = Field(default_factory=datetime.utcnow)
+    expira: datetime = Field(index=True)
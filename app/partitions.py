@@ -0,0 +1,308 @@
+"""
+Particionado de tablas grandes (PostgreSQL), opcional y sobre una base nueva.
+
+- VENTAS_PARTICIONADAS=true: `venta` y `detalleventa` por rango mensual de `fecha`;
+  `detalleventa` usa la misma clave (`fecha` copiada de la venta), de modo que el
+  detalle de un mes vive junto a sus ventas.
+- INVENTARIO_PARTICIONADO=true: `inventario` por lista de `sucursal_id`, una partición
+  por sucursal, para que la carga de una sede no compita con las demás.
+
+Mantenimiento:
+    python -m app.partitions crear --meses 3
+    python -m app.partitions archivar --antes 2024-01-01 --directorio archivo
+    python -m app.partitions archivar --antes 2024-01-01 --solo-desconectar
+"""
+import argparse
+import gzip
+import os
+import re
+import time
+from datetime import date, datetime
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import SQLModel
+
+from .database import engine
+
+VENTAS_PARTICIONADAS = os.getenv("VENTAS_PARTICIONADAS", "false").lower() in ("1", "true", "si", "yes")
+INVENTARIO_PARTICIONADO = os.getenv("INVENTARIO_PARTICIONADO", "false").lower() in ("1", "true", "si", "yes")
+PARTICIONES_FUTURAS = int(os.getenv("PARTICIONES_FUTURAS", "3"))
+PARTICIONES_LOCK_TIMEOUT = os.getenv("PARTICIONES_LOCK_TIMEOUT", "2s")
+PARTICIONES_REINTENTOS = int(os.getenv("PARTICIONES_REINTENTOS", "10"))
+
+LOCK_NOT_AVAILABLE = "55P03"
+
+TABLAS_PARTICIONADAS = ("venta", "detalleventa")
+PATRON_PARTICION = re.compile(r"^(venta|detalleventa)_(\d{4})_(\d{2})$")
+
+DDL_TABLAS = [
+    """
+    CREATE TABLE IF NOT EXISTS venta (
+        id SERIAL NOT NULL,
+        fecha TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        sucursal_id INTEGER NOT NULL REFERENCES sucursal (id),
+        cliente_id INTEGER NOT NULL REFERENCES cliente (id),
+        asesor_id INTEGER NOT NULL REFERENCES asesor (id),
+        total FLOAT NOT NULL,
+        PRIMARY KEY (id, fecha)
+    ) PARTITION BY RANGE (fecha)
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_venta_fecha ON venta (fecha)",
+    "CREATE INDEX IF NOT EXISTS ix_venta_sucursal_fecha ON venta (sucursal_id, fecha)",
+    """
+    CREATE TABLE IF NOT EXISTS detalleventa (
+        id SERIAL NOT NULL,
+        venta_id INTEGER NOT NULL,
+        fecha TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        llanta_id INTEGER NOT NULL REFERENCES llanta (id),
+        cantidad INTEGER NOT NULL,
+        precio_unitario FLOAT NOT NULL,
+        subtotal FLOAT NOT NULL,
+        PRIMARY KEY (id, fecha),
+        FOREIGN KEY (venta_id, fecha) REFERENCES venta (id, fecha)
+    ) PARTITION BY RANGE (fecha)
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_detalleventa_venta_fecha ON detalleventa (venta_id, fecha)",
+    "CREATE TABLE IF NOT EXISTS venta_default PARTITION OF venta DEFAULT",
+    "CREATE TABLE IF NOT EXISTS detalleventa_default PARTITION OF detalleventa DEFAULT",
+]
+
+DDL_INVENTARIO = [
+    """
+    CREATE TABLE IF NOT EXISTS inventario (
+        id SERIAL NOT NULL,
+        sucursal_id INTEGER NOT NULL REFERENCES sucursal (id),
+        llanta_id INTEGER NOT NULL REFERENCES llanta (id),
+        cantidad_disponible INTEGER NOT NULL,
+        umbral_minimo INTEGER NOT NULL,
+        PRIMARY KEY (id, sucursal_id),
+        UNIQUE (sucursal_id, llanta_id)
+    ) PARTITION BY LIST (sucursal_id)
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_inventario_llanta_id ON inventario (llanta_id)",
+    "CREATE TABLE IF NOT EXISTS inventario_default PARTITION OF inventario DEFAULT",
+]
+
+
+def _inicio_mes(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def _sumar_meses(d: date, meses: int) -> date:
+    indice = d.year * 12 + (d.month - 1) + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def nombre_particion(tabla: str, mes: date) -> str:
+    return f"{tabla}_{mes.year:04d}_{mes.month:02d}"
+
+
+def crear_esquema_particionado() -> None:
+    """Crea todas las tablas, con las particionadas según la configuración, y las particiones iniciales."""
+    particionadas = set()
+    ddl = []
+    if INVENTARIO_PARTICIONADO:
+        particionadas.add("inventario")
+        ddl += DDL_INVENTARIO
+    if VENTAS_PARTICIONADAS:
+        particionadas.update(TABLAS_PARTICIONADAS)
+        ddl += DDL_TABLAS
+
+    otras = [t for t in SQLModel.metadata.sorted_tables if t.name not in particionadas]
+    SQLModel.metadata.create_all(engine, tables=otras)
+    with engine.begin() as conn:
+        for sentencia in ddl:
+            conn.execute(text(sentencia))
+    # Tablas que dependan de las particionadas (si existen) se crean ahora que ya están.
+    SQLModel.metadata.create_all(engine)
+    if VENTAS_PARTICIONADAS:
+        crear_particiones(meses=PARTICIONES_FUTURAS)
+
+
+def crear_particion_sucursal(conn, sucursal_id: int) -> None:
+    """Crea la partición de inventario de una sucursal. Debe hacerse antes de insertar su stock."""
+    if not INVENTARIO_PARTICIONADO:
+        return
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS inventario_s{int(sucursal_id)} "
+        f"PARTITION OF inventario FOR VALUES IN ({int(sucursal_id)})"
+    ))
+
+
+def _filas_en_default(conn, mes: date, siguiente: date) -> bool:
+    return conn.execute(text("""
+        SELECT EXISTS (SELECT 1 FROM venta_default WHERE fecha >= :desde AND fecha < :hasta)
+            OR EXISTS (SELECT 1 FROM detalleventa_default WHERE fecha >= :desde AND fecha < :hasta)
+    """), {"desde": mes, "hasta": siguiente}).scalar()
+
+
+def crear_particiones(meses: int = PARTICIONES_FUTURAS, desde: Optional[date] = None) -> List[str]:
+    """
+    Crea (si faltan) las particiones del mes `desde` (por defecto el actual) y de los `meses`
+    siguientes, una transacción corta por mes.
+
+    Si ya hay filas de ese mes en DEFAULT (p. ej. no se ejecutó `crear` a tiempo), un
+    CREATE ... PARTITION OF fallaría; en ese caso se crean tablas sueltas, se mueven las filas
+    y luego se conectan. El detalle sale de DEFAULT antes que la venta y la venta se conecta
+    antes que el detalle, para que la llave foránea compuesta siempre encuentre su venta.
+    """
+    inicio = _inicio_mes(desde or datetime.utcnow().date())
+    creadas = []
+    for i in range(meses + 1):
+        mes = _sumar_meses(inicio, i)
+        siguiente = _sumar_meses(mes, 1)
+        limites = f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{siguiente.isoformat()}')"
+        rango = {"desde": mes, "hasta": siguiente}
+        with engine.begin() as conn:
+            faltantes = [t for t in TABLAS_PARTICIONADAS
+                         if not conn.execute(text("SELECT to_regclass(:n)"),
+                                             {"n": nombre_particion(t, mes)}).scalar()]
+            if not faltantes:
+                continue
+            if not _filas_en_default(conn, mes, siguiente):
+                for tabla in faltantes:
+                    conn.execute(text(f"CREATE TABLE {nombre_particion(tabla, mes)} PARTITION OF {tabla} {limites}"))
+            else:
+                for tabla in ("detalleventa", "venta"):
+                    if tabla not in faltantes:
+                        continue
+                    nombre = nombre_particion(tabla, mes)
+                    conn.execute(text(f"CREATE TABLE {nombre} (LIKE {tabla} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+                    conn.execute(text(f"""
+                        WITH movidas AS (
+                            DELETE FROM {tabla}_default WHERE fecha >= :desde AND fecha < :hasta RETURNING *
+                        )
+                        INSERT INTO {nombre} SELECT * FROM movidas
+                    """), rango)
+                for tabla in ("venta", "detalleventa"):
+                    if tabla in faltantes:
+                        conn.execute(text(f"ALTER TABLE {tabla} ATTACH PARTITION {nombre_particion(tabla, mes)} {limites}"))
+                print(f"⚠️ Filas de {mes:%Y-%m} movidas desde las particiones DEFAULT")
+            creadas += [nombre_particion(t, mes) for t in faltantes]
+    return creadas
+
+
+def listar_particiones(conn, tabla: str) -> List[tuple]:
+    """Retorna [(nombre, mes)] de las particiones mensuales de `tabla`, ordenadas por mes."""
+    filas = conn.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:tabla AS regclass)
+    """), {"tabla": tabla}).scalars().all()
+
+    particiones = []
+    for nombre in filas:
+        m = PATRON_PARTICION.match(nombre)
+        if m:
+            particiones.append((nombre, date(int(m.group(2)), int(m.group(3)), 1)))
+    return sorted(particiones, key=lambda p: p[1])
+
+
+def _exportar_gzip(conn, nombre: str, directorio: str) -> str:
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, f"{nombre}.csv.gz")
+    cursor = conn.connection.dbapi_connection.cursor()
+    with gzip.open(ruta, "wb") as destino:
+        cursor.copy_expert(f"COPY {nombre} TO STDOUT WITH (FORMAT csv, HEADER true)", destino)
+    cursor.close()
+    return ruta
+
+
+def _quitar_fk_a_venta(conn, nombre: str) -> None:
+    """Una partición de detalle desconectada conserva su FK hacia `venta`; se quita para poder desconectar la venta."""
+    restricciones = conn.execute(text("""
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = CAST(:tabla AS regclass)
+          AND contype = 'f'
+          AND confrelid = CAST('venta' AS regclass)
+    """), {"tabla": nombre}).scalars().all()
+    for conname in restricciones:
+        conn.execute(text(f'ALTER TABLE {nombre} DROP CONSTRAINT "{conname}"'))
+
+
+def _ddl_corto(accion: Callable[[Any], None]) -> None:
+    """
+    Ejecuta `accion(conn)` en su propia transacción corta con lock_timeout. Un DETACH o un DROP
+    que espera su lock detrás de una consulta larga bloquearía a su vez todas las inserciones
+    de ventas; con el timeout se cede y se reintenta en lugar de hacer fila.
+    """
+    for intento in range(1, PARTICIONES_REINTENTOS + 1):
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(f"SET LOCAL lock_timeout = '{PARTICIONES_LOCK_TIMEOUT}'"))
+                accion(conn)
+            return
+        except OperationalError as e:
+            if getattr(e.orig, "pgcode", None) != LOCK_NOT_AVAILABLE or intento == PARTICIONES_REINTENTOS:
+                raise
+            time.sleep(intento)
+
+
+def _desconectar(tabla: str, nombre: str) -> None:
+    """DETACH ... CONCURRENTLY si la tabla no tiene partición DEFAULT (Postgres no lo permite con ella)."""
+    with engine.connect() as conn:
+        tiene_default = conn.execute(text("SELECT to_regclass(:n)"), {"n": f"{tabla}_default"}).scalar()
+    if tiene_default:
+        _ddl_corto(lambda conn: conn.execute(text(f"ALTER TABLE {tabla} DETACH PARTITION {nombre}")))
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"ALTER TABLE {tabla} DETACH PARTITION {nombre} CONCURRENTLY"))
+
+
+def archivar_particiones(antes: date, directorio: str = "archivo",
+                         solo_desconectar: bool = False) -> List[str]:
+    """
+    Desconecta las particiones de meses anteriores a `antes`, cada una en su transacción corta.
+    - solo_desconectar=True: quedan como tablas sueltas (fuera de las consultas).
+    - si no: se exportan a `<directorio>/<particion>.csv.gz` ya desconectadas (sin bloquear
+      `venta` mientras se comprime) y luego se eliminan.
+    El detalle se procesa antes que la venta por la llave foránea compuesta.
+    """
+    limite = _inicio_mes(antes)
+    with engine.connect() as conn:
+        particiones = {tabla: listar_particiones(conn, tabla) for tabla in ("detalleventa", "venta")}
+
+    resultado = []
+    for tabla in ("detalleventa", "venta"):
+        for nombre, mes in particiones[tabla]:
+            if mes >= limite:
+                continue
+            _desconectar(tabla, nombre)
+            if solo_desconectar:
+                _ddl_corto(lambda conn: _quitar_fk_a_venta(conn, nombre))
+                resultado.append(nombre)
+                continue
+            with engine.connect() as conn:
+                ruta = _exportar_gzip(conn, nombre, directorio)
+            _ddl_corto(lambda conn: conn.execute(text(f"DROP TABLE {nombre}")))
+            resultado.append(ruta)
+    return resultado
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Mantenimiento de particiones de ventas")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_crear = sub.add_parser("crear", help="Crear particiones del mes actual y siguientes")
+    p_crear.add_argument("--meses", type=int, default=PARTICIONES_FUTURAS)
+
+    p_arch = sub.add_parser("archivar", help="Desconectar/archivar particiones antiguas")
+    p_arch.add_argument("--antes", type=date.fromisoformat, required=True,
+                        help="Fecha YYYY-MM-DD; se archivan los meses anteriores")
+    p_arch.add_argument("--directorio", default="archivo")
+    p_arch.add_argument("--solo-desconectar", action="store_true")
+
+    args = parser.parse_args(argv)
+    if args.comando == "crear":
+        creadas = crear_particiones(meses=args.meses)
+        print(f"✅ Particiones creadas: {', '.join(creadas) if creadas else 'ninguna (ya existían)'}")
+    else:
+        archivadas = archivar_particiones(args.antes, args.directorio, args.solo_desconectar)
+        print(f"✅ Particiones archivadas: {', '.join(archivadas) if archivadas else 'ninguna'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Perfilado opcional por solicitud.
+
+Solo se instala si PROFILING_ENABLED=true; apagado no agrega middleware, eventos ni
+envolturas, así que el costo es cero. Encendido, una solicitud se perfila cuando trae
+el header `X-Profile: <PROFILING_TOKEN>` (o `?profile=...`) y pasa el muestreo
+PROFILING_SAMPLE_RATE; sin PROFILING_TOKEN no arranca, porque los perfiles exponen SQL y
+código. El perfil se guarda en PROFILING_DIR, que conserva los últimos PROFILING_MAX_PERFILES:
+- `<id>.folded`: pilas en formato "collapsed" (flamegraph.pl, speedscope), en microsegundos.
+- `<id>.json`: ruta, duración y sentencias SQL con su tiempo.
+La respuesta trae el header `X-Profile-Id` para consultarlo en `GET /perfiles/{id}`, que
+exige el mismo token.
+"""
+import functools
+import inspect
+import json
+import os
+import random
+import re
+import secrets
+import sys
+import time
+import uuid
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Optional
+from urllib.parse import parse_qs
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from .database import engine
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "si", "yes")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "1.0"))
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+PROFILING_DIR = os.getenv("PROFILING_DIR", "perfiles")
+PROFILING_MAX_PERFILES = int(os.getenv("PROFILING_MAX_PERFILES", "200"))
+
+PATRON_ID = re.compile(r"^[0-9a-f]{32}$")
+
+_perfil_actual: ContextVar[Optional["Perfil"]] = ContextVar("perfil_actual", default=None)
+
+
+class Trazador:
+    """Perfilador determinista (sys.setprofile) que acumula tiempo propio por pila completa."""
+
+    def __init__(self):
+        self.pila = []
+        self.tiempos = defaultdict(int)
+        self.ultimo = time.perf_counter_ns()
+
+    @staticmethod
+    def _etiqueta_codigo(code) -> str:
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def __call__(self, frame, evento, arg):
+        ahora = time.perf_counter_ns()
+        if self.pila:
+            self.tiempos[tuple(self.pila)] += ahora - self.ultimo
+
+        if evento == "call":
+            self.pila.append(self._etiqueta_codigo(frame.f_code))
+        elif evento == "c_call":
+            self.pila.append(getattr(arg, "__qualname__", repr(arg)))
+        elif self.pila and evento in ("return", "c_return", "c_exception"):
+            self.pila.pop()
+
+        self.ultimo = time.perf_counter_ns()
+
+    def folded(self) -> str:
+        return "\n".join(f"{';'.join(pila)} {ns // 1000}"
+                         for pila, ns in self.tiempos.items() if ns >= 1000)
+
+
+class Perfil:
+    def __init__(self, metodo: str, ruta: str):
+        self.id = uuid.uuid4().hex
+        self.metodo = metodo
+        self.ruta = ruta
+        self.trazador = Trazador()
+        self.sql = []
+        self.duracion_ms = 0.0
+
+    def guardar(self, directorio: str = PROFILING_DIR) -> None:
+        os.makedirs(directorio, exist_ok=True)
+        _rotar(directorio, PROFILING_MAX_PERFILES - 1)
+        with open(os.path.join(directorio, f"{self.id}.folded"), "w", encoding="utf-8") as f:
+            f.write(self.trazador.folded())
+        with open(os.path.join(directorio, f"{self.id}.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "id": self.id,
+                "metodo": self.metodo,
+                "ruta": self.ruta,
+                "duracion_ms": round(self.duracion_ms, 3),
+                "sql_total_ms": round(sum(s["ms"] for s in self.sql), 3),
+                "sql": self.sql,
+            }, f, ensure_ascii=False, indent=2)
+
+
+def _rotar(directorio: str, conservar: int) -> None:
+    """Borra los perfiles más antiguos (por fecha de modificación) hasta dejar `conservar`."""
+    with os.scandir(directorio) as entradas:
+        perfiles = sorted((e.stat().st_mtime, e.name[:-5]) for e in entradas
+                          if e.name.endswith(".json") and PATRON_ID.match(e.name[:-5]))
+    for _, perfil_id in perfiles[:max(0, len(perfiles) - conservar)]:
+        for extension in ("json", "folded"):
+            try:
+                os.remove(os.path.join(directorio, f"{perfil_id}.{extension}"))
+            except FileNotFoundError:
+                pass  # otro worker ya lo borró
+
+
+def _token_presentado(scope) -> Optional[str]:
+    """Valor del header X-Profile o, si no viene, del parámetro ?profile=."""
+    for nombre, contenido in scope.get("headers", []):
+        if nombre == b"x-profile":
+            return contenido.decode("latin-1")
+    return parse_qs(scope.get("query_string", b"").decode("latin-1")).get("profile", [None])[0]
+
+
+def _token_valido(scope) -> bool:
+    valor = _token_presentado(scope)
+    if not valor or not PROFILING_TOKEN:
+        return False
+    return secrets.compare_digest(valor.encode(), PROFILING_TOKEN.encode())
+
+
+# ---------- Envoltura de endpoints ----------
+
+def _perfilar_endpoint(endpoint):
+    if inspect.iscoroutinefunction(endpoint):
+        return endpoint  # todos los endpoints son sync; un async compartiría el hilo del event loop
+
+    @functools.wraps(endpoint)
+    def envoltura(*args, **kwargs):
+        perfil = _perfil_actual.get()
+        if perfil is None:
+            return endpoint(*args, **kwargs)
+        # sys.setprofile es por hilo: aquí corre el hilo del threadpool que ejecuta el endpoint
+        sys.setprofile(perfil.trazador)
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            sys.setprofile(None)
+
+    return envoltura
+
+
+class RutaPerfilada(APIRoute):
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _perfilar_endpoint(endpoint), **kwargs)
+
+
+# ---------- SQL ----------
+
+def _antes_sql(conn, cursor, statement, parameters, context, executemany):
+    if _perfil_actual.get() is not None:
+        conn.info.setdefault("perfil_inicios", []).append(time.perf_counter())
+
+
+def _despues_sql(conn, cursor, statement, parameters, context, executemany):
+    perfil = _perfil_actual.get()
+    if perfil is None or not conn.info.get("perfil_inicios"):
+        return
+    inicio = conn.info["perfil_inicios"].pop()
+    perfil.sql.append({
+        "sql": statement,
+        "ms": round((time.perf_counter() - inicio) * 1000, 3),
+        "filas": cursor.rowcount,
+    })
+
+
+# ---------- Middleware ----------
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["path"].startswith("/perfiles/")
+                or not _token_valido(scope) or random.random() >= PROFILING_SAMPLE_RATE):
+            await self.app(scope, receive, send)
+            return
+
+        perfil = Perfil(scope["method"], scope["path"])
+
+        async def enviar(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Id", perfil.id)
+            await send(message)
+
+        token = _perfil_actual.set(perfil)
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            perfil.duracion_ms = (time.perf_counter() - inicio) * 1000
+            _perfil_actual.reset(token)
+            await anyio.to_thread.run_sync(perfil.guardar)
+
+
+# ---------- Consulta de perfiles ----------
+
+def _exigir_token(request: Request) -> None:
+    if not _token_valido(request.scope):
+        raise HTTPException(status_code=403, detail="Token de perfilado inválido")
+
+
+router = APIRouter(prefix="/perfiles", tags=["perfiles"], dependencies=[Depends(_exigir_token)])
+
+
+def _ruta_perfil(perfil_id: str, extension: str) -> str:
+    if not PATRON_ID.match(perfil_id):
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    ruta = os.path.join(PROFILING_DIR, f"{perfil_id}.{extension}")
+    if not os.path.exists(ruta):
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return ruta
+
+
+@router.get("/{perfil_id}")
+def obtener_perfil(perfil_id: str):
+    """Duración y sentencias SQL de una solicitud perfilada"""
+    with open(_ruta_perfil(perfil_id, "json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+@router.get("/{perfil_id}/flamegraph", response_class=PlainTextResponse)
+def obtener_flamegraph(perfil_id: str):
+    """Pilas en formato collapsed para flamegraph.pl o speedscope"""
+    with open(_ruta_perfil(perfil_id, "folded"), encoding="utf-8") as f:
+        return f.read()
+
+
+def instalar_perfilado(app) -> None:
+    """Registra middleware, eventos SQL y rutas de consulta. Llamar antes de declarar endpoints."""
+    if not PROFILING_TOKEN:
+        raise ValueError("❌ PROFILING_ENABLED=true requiere PROFILING_TOKEN")
+    if PROFILING_MAX_PERFILES < 1:
+        raise ValueError("❌ PROFILING_MAX_PERFILES debe ser al menos 1")
+    app.router.route_class = RutaPerfilada
+    app.add_middleware(ProfilingMiddleware)
+    event.listen(engine, "before_cursor_execute", _antes_sql)
+    event.listen(engine, "after_cursor_execute", _despues_sql)
+    app.include_router(router)
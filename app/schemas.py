@@ -1,8 +1,10 @@
 from typing import Optional, List
 from datetime import datetime
-from sqlmodel import SQLModel
+from sqlmodel import SQLModel, Field
 from pydantic import ConfigDict
 
+from .forecast import PRONOSTICO_MAX_DIAS
+
 
 # ------- Inputs -------
 class LlantaIn(SQLModel):
@@ -13,11 +15,56 @@ class LlantaIn(SQLModel):
     precio_venta: float
 
 
+class CambioPrecioIn(SQLModel):
+    tipo: str  # "porcentaje" | "absoluto"
+    valor: float
+    marca: Optional[str] = None
+    medida: Optional[str] = None
+    skus: Optional[List[str]] = None
+    todas: bool = False
+    efectiva_desde: Optional[datetime] = None  # None = ahora
+
+
 class AjusteInventarioIn(SQLModel):
     delta: int
     umbral_minimo: int
 
 
+class ConteoItemIn(SQLModel):
+    llanta_id: Optional[int] = None
+    sku: Optional[str] = None
+    cantidad: int
+    umbral_minimo: Optional[int] = None
+
+
+class ConteoIn(SQLModel):
+    sucursal_id: Optional[int] = None  # None = sucursal principal
+    items: List[ConteoItemIn]
+
+
+class SucursalIn(SQLModel):
+    nombre: str
+    codigo: str
+
+
+class TransferenciaItemIn(SQLModel):
+    llanta_id: int
+    cantidad: int
+
+
+class TransferenciaIn(SQLModel):
+    origen_id: int
+    destino_id: int
+    items: List[TransferenciaItemIn]
+
+
+class AplicarSugerenciasIn(SQLModel):
+    sucursal_id: Optional[int] = None
+    llanta_ids: Optional[List[int]] = None  # None = todo el catálogo
+    lead_time: Optional[int] = Field(default=None, ge=1, le=PRONOSTICO_MAX_DIAS)
+    dias_cobertura: Optional[int] = Field(default=None, ge=1, le=PRONOSTICO_MAX_DIAS)
+
+
 class ClienteIn(SQLModel):
     nombre: str
     documento: str
@@ -37,6 +84,7 @@ class VentaItemIn(SQLModel):
 
 
 class VentaIn(SQLModel):
+    sucursal_id: Optional[int] = None  # None = sucursal principal
     cliente_id: int
     asesor_id: int
     items: List[VentaItemIn]
@@ -54,9 +102,50 @@ class LlantaRead(SQLModel):
     activa: bool
 
 
+class CambioPrecioRead(SQLModel):
+    model_config = ConfigDict(from_attributes=True)
+    id: int
+    tipo: str
+    valor: float
+    marca: Optional[str] = None
+    medida: Optional[str] = None
+    efectiva_desde: datetime
+    estado: str
+    aplicado_en: Optional[datetime] = None
+    llantas_afectadas: int
+
+
+class HistorialPrecioRead(SQLModel):
+    model_config = ConfigDict(from_attributes=True)
+    llanta_id: int
+    cambio_id: Optional[int] = None
+    precio_anterior: float
+    precio_nuevo: float
+    fecha: datetime
+
+
+class SucursalRead(SQLModel):
+    model_config = ConfigDict(from_attributes=True)
+    id: int
+    nombre: str
+    codigo: str
+    activa: bool
+
+
+class TransferenciaRead(SQLModel):
+    model_config = ConfigDict(from_attributes=True)
+    id: int
+    fecha: datetime
+    origen_id: int
+    destino_id: int
+    llanta_id: int
+    cantidad: int
+
+
 class InventarioRead(SQLModel):
     model_config = ConfigDict(from_attributes=True)
     id: int
+    sucursal_id: int
     llanta_id: int
     cantidad_disponible: int
     umbral_minimo: int
@@ -83,6 +172,7 @@ class VentaRead(SQLModel):
     model_config = ConfigDict(from_attributes=True)
     id: int
     fecha: datetime
+    sucursal_id: int
     cliente_id: int
     asesor_id: int
     total: float
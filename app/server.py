@@ -0,0 +1,76 @@
+"""
+Servidor de producción con varios workers.
+
+    python -m app.server                 # un worker por CPU
+    python -m app.server --workers 4 --port 8000
+    python -m app.server --reload        # desarrollo: un solo proceso con recarga
+
+El presupuesto de conexiones a la BD (DB_POOL_BUDGET) se reparte entre los workers:
+cada uno recibe DB_POOL_SIZE / DB_MAX_OVERFLOW proporcionales en lugar de 5 + 10 propios.
+
+Recarga sin cortar ventas en curso: `kill -HUP <pid del proceso principal>` reinicia los
+workers uno por uno; cada uno deja de aceptar conexiones y termina las solicitudes en
+curso (hasta GRACEFUL_TIMEOUT segundos) antes de ser reemplazado, mientras los demás siguen atendiendo.
+"""
+import argparse
+import os
+from typing import List, Optional, Tuple
+
+import uvicorn
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_POOL_BUDGET = int(os.getenv("DB_POOL_BUDGET", "15"))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
+
+def workers_por_defecto() -> int:
+    return int(os.getenv("WEB_WORKERS", str(os.cpu_count() or 1)))
+
+
+def repartir_pool(presupuesto: int, workers: int) -> Tuple[int, int]:
+    """Retorna (pool_size, max_overflow) por worker: 1/3 fijo y el resto como desborde."""
+    por_worker = max(1, presupuesto // workers)
+    pool_size = max(1, por_worker // 3)
+    return pool_size, por_worker - pool_size
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Servidor Serviteca Llantas API")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--reload", action="store_true", help="Modo desarrollo (un solo proceso)")
+    args = parser.parse_args(argv)
+
+    workers = 1 if args.reload else (args.workers or workers_por_defecto())
+    if workers * 2 > DB_POOL_BUDGET:
+        workers = max(1, DB_POOL_BUDGET // 2)
+        print(f"⚠️ DB_POOL_BUDGET={DB_POOL_BUDGET} alcanza para {workers} workers con 2 conexiones cada uno")
+
+    pool_size, max_overflow = repartir_pool(DB_POOL_BUDGET, workers)
+    # Los workers heredan el entorno: database.py lee estos valores al crear el engine
+    os.environ["DB_POOL_SIZE"] = str(pool_size)
+    os.environ["DB_MAX_OVERFLOW"] = str(max_overflow)
+
+    # Crear tablas una sola vez aquí evita que N workers compitan haciendo DDL al arrancar
+    from .database import init_db, cerrar_pool
+    if init_db():
+        os.environ["SERVITECA_DB_INICIALIZADA"] = "1"
+    cerrar_pool()
+
+    print(f"🚀 {workers} worker(s) en {args.host}:{args.port} — pool por worker: "
+          f"{pool_size} + {max_overflow} (presupuesto {DB_POOL_BUDGET})")
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=None if args.reload else workers,
+        reload=args.reload,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,73 +1,508 @@
-from typing import List, Dict
-from sqlmodel import Session, select
-from .models import Llanta, Inventario, Venta, DetalleVenta
+import json
+import os
+from datetime import datetime
+from typing import List, Dict, Optional
+from sqlalchemy import Numeric, cast, func, literal, text
+from sqlmodel import Session, select, update, insert
+from .models import (
+    Llanta, Inventario, Venta, CambioPrecio, HistorialPrecio, Sucursal, Transferencia,
+    MovimientoInventario
+)
+from .partitions import crear_particion_sucursal
+
+PRECIOS_LOTE = int(os.getenv("PRECIOS_LOTE", "500"))
+SUCURSAL_PRINCIPAL_ID = int(os.getenv("SUCURSAL_PRINCIPAL_ID", "1"))
 
 
 class StockError(Exception):
     pass
 
 
+class PrecioError(Exception):
+    pass
+
+
+def crear_sucursal_principal(session: Session) -> None:
+    """Garantiza que exista al menos una sucursal (la principal) en una base nueva."""
+    if session.exec(select(Sucursal.id).limit(1)).first() is None:
+        crear_sucursal(session, nombre="Principal", codigo="PRINCIPAL")
+
+
+def crear_sucursal(session: Session, *, nombre: str, codigo: str) -> Sucursal:
+    """Crea la sucursal, su partición de inventario (si aplica) y stock en 0 para todo el catálogo."""
+    sucursal = Sucursal(nombre=nombre, codigo=codigo, activa=True)
+    session.add(sucursal)
+    session.flush()  # para obtener id
+    crear_particion_sucursal(session.connection(), sucursal.id)
+    session.exec(
+        insert(Inventario).from_select(
+            ["sucursal_id", "llanta_id", "cantidad_disponible", "umbral_minimo"],
+            select(literal(sucursal.id), Llanta.id, literal(0), literal(0))
+        )
+    )
+    session.commit()
+    session.refresh(sucursal)
+    return sucursal
+
+
 def crear_llanta_con_inventario(session: Session, *, sku: str, marca: str, modelo: str,
                                 medida: str, precio_venta: float) -> Llanta:
     llanta = Llanta(sku=sku, marca=marca, modelo=modelo, medida=medida,
                     precio_venta=precio_venta, activa=True)
     session.add(llanta)
     session.flush()  # para obtener id
-    inv = Inventario(llanta_id=llanta.id, cantidad_disponible=0, umbral_minimo=0)
-    session.add(inv)
+    # Inventario en 0 en cada sucursal
+    session.exec(
+        insert(Inventario).from_select(
+            ["sucursal_id", "llanta_id", "cantidad_disponible", "umbral_minimo"],
+            select(Sucursal.id, literal(llanta.id), literal(0), literal(0))
+        )
+    )
     session.commit()
     session.refresh(llanta)
     return llanta
 
 
-def ajustar_inventario(session: Session, *, llanta_id: int, delta: int, nuevo_umbral_minimo: int):
-    inv = session.exec(select(Inventario).where(Inventario.llanta_id == llanta_id)).one()
+def ajustar_inventario(session: Session, *, llanta_id: int, delta: int, nuevo_umbral_minimo: int,
+                       sucursal_id: int = SUCURSAL_PRINCIPAL_ID, confirmar: bool = True):
+    """Con confirmar=False deja la transacción abierta para que quien llama confirme."""
+    inv = session.exec(select(Inventario)
+                       .where(Inventario.sucursal_id == sucursal_id)
+                       .where(Inventario.llanta_id == llanta_id)
+                       .with_for_update()).one()
     nuevo_stock = inv.cantidad_disponible + delta
     if nuevo_stock < 0:
         raise StockError("No se puede dejar inventario negativo")
     inv.cantidad_disponible = nuevo_stock
     inv.umbral_minimo = int(nuevo_umbral_minimo)
     session.add(inv)
-    session.commit()
+    if delta:
+        session.add(MovimientoInventario(sucursal_id=sucursal_id, llanta_id=llanta_id,
+                                         tipo="ajuste", delta=delta))
+    if confirmar:
+        session.commit()
+    else:
+        session.flush()
     return inv
 
 
-def crear_venta(session: Session, *, cliente_id: int, asesor_id: int,
-                items: List[Dict[str, int]]) -> Venta:
-    ids = [i["llanta_id"] for i in items]
-    llantas = {l.id: l for l in session.exec(select(Llanta).where(Llanta.id.in_(ids))).all()}
-    inventarios = {inv.llanta_id: inv for inv in
-                   session.exec(select(Inventario).where(Inventario.llanta_id.in_(ids))).all()}
+SQL_CONTEO = text("""
+    WITH conteo AS (
+        SELECT *
+        FROM unnest(CAST(:llanta_ids AS integer[]),
+                    CAST(:cantidades AS integer[]),
+                    CAST(:umbrales AS integer[])) AS c (llanta_id, cantidad, umbral)
+    ),
+    anterior AS (
+        SELECT i.id, i.cantidad_disponible AS anterior
+        FROM inventario i
+        JOIN conteo c ON c.llanta_id = i.llanta_id
+        WHERE i.sucursal_id = :sucursal_id
+        ORDER BY i.llanta_id
+        FOR UPDATE OF i
+    ),
+    actualizados AS (
+        UPDATE inventario AS i
+        SET cantidad_disponible = c.cantidad,
+            umbral_minimo = COALESCE(c.umbral, i.umbral_minimo)
+        FROM conteo c, anterior a
+        WHERE i.sucursal_id = :sucursal_id AND i.llanta_id = c.llanta_id AND i.id = a.id
+        RETURNING i.sucursal_id, i.llanta_id, a.anterior, i.cantidad_disponible, i.umbral_minimo
+    ),
+    movimientos AS (
+        INSERT INTO movimientoinventario (fecha, sucursal_id, llanta_id, tipo, delta)
+        SELECT :ahora, sucursal_id, llanta_id, 'conteo', cantidad_disponible - anterior
+        FROM actualizados
+        WHERE cantidad_disponible <> anterior
+    )
+    SELECT a.llanta_id, l.sku, a.anterior, a.cantidad_disponible, a.umbral_minimo
+    FROM actualizados a
+    JOIN llanta l ON l.id = a.llanta_id
+""")
+
+
+def aplicar_conteo(session: Session, lineas: List[Dict],
+                   sucursal_id: int = SUCURSAL_PRINCIPAL_ID) -> Dict:
+    """
+    Aplica un conteo físico con semántica absoluta: la cantidad contada reemplaza el stock.
+    Cada línea trae llanta_id o sku, cantidad y opcionalmente umbral_minimo; si una llanta
+    aparece en varias líneas (p. ej. contada en dos estantes) las cantidades se suman.
+    Todo se aplica en una sola sentencia y una sola transacción, que también registra cada
+    diferencia como MovimientoInventario. Retorna el reporte de diferencias.
+    """
+    for linea in lineas:
+        if linea.get("llanta_id") is None and not linea.get("sku"):
+            raise StockError("Cada línea del conteo debe indicar llanta_id o sku")
+        if linea["cantidad"] < 0:
+            raise StockError("La cantidad contada no puede ser negativa")
 
+    skus = list({l["sku"] for l in lineas if l.get("llanta_id") is None})
+    id_por_sku = {}
+    if skus:
+        id_por_sku = dict(session.exec(
+            text("SELECT sku, id FROM llanta WHERE sku = ANY(:skus)"), params={"skus": skus}
+        ).all())
+
+    cantidades: Dict[int, int] = {}
+    umbrales: Dict[int, Optional[int]] = {}
+    no_encontrados = []
+    for linea in lineas:
+        llanta_id = linea.get("llanta_id")
+        if llanta_id is None:
+            llanta_id = id_por_sku.get(linea["sku"])
+            if llanta_id is None:
+                no_encontrados.append(linea["sku"])
+                continue
+        cantidades[llanta_id] = cantidades.get(llanta_id, 0) + linea["cantidad"]
+        if linea.get("umbral_minimo") is not None:
+            umbrales[llanta_id] = linea["umbral_minimo"]
+
+    ids = list(cantidades)
+    filas = session.exec(SQL_CONTEO, params={
+        "sucursal_id": sucursal_id,
+        "ahora": datetime.utcnow(),
+        "llanta_ids": ids,
+        "cantidades": [cantidades[i] for i in ids],
+        "umbrales": [umbrales.get(i) for i in ids],
+    }).all() if ids else []
+    session.commit()
+
+    actualizados = {f.llanta_id for f in filas}
+    no_encontrados += [i for i in ids if i not in actualizados]
+
+    diferencias = []
+    faltantes = sobrantes = 0
+    for f in filas:
+        diferencia = f.cantidad_disponible - f.anterior
+        if diferencia < 0:
+            faltantes -= diferencia
+        elif diferencia > 0:
+            sobrantes += diferencia
+        if diferencia != 0:
+            diferencias.append({
+                "llanta_id": f.llanta_id,
+                "sku": f.sku,
+                "cantidad_anterior": f.anterior,
+                "cantidad_contada": f.cantidad_disponible,
+                "diferencia": diferencia,
+            })
+
+    return {
+        "sucursal_id": sucursal_id,
+        "lineas": len(lineas),
+        "llantas_actualizadas": len(filas),
+        "llantas_con_diferencia": len(diferencias),
+        "unidades_faltantes": faltantes,
+        "unidades_sobrantes": sobrantes,
+        "diferencias": sorted(diferencias, key=lambda d: abs(d["diferencia"]), reverse=True),
+        "no_encontrados": no_encontrados,
+    }
+
+
+SQL_DESCONTAR_STOCK = text("""
+    WITH pedido AS (
+        SELECT *
+        FROM unnest(CAST(:llanta_ids AS integer[]),
+                    CAST(:cantidades AS integer[])) AS p (llanta_id, cantidad)
+    ),
+    bloqueo AS (
+        SELECT i.id
+        FROM inventario i
+        JOIN pedido p ON p.llanta_id = i.llanta_id
+        WHERE i.sucursal_id = :sucursal_id
+        ORDER BY i.llanta_id
+        FOR UPDATE OF i
+    )
+    UPDATE inventario AS i
+    SET cantidad_disponible = i.cantidad_disponible - p.cantidad
+    FROM pedido p, bloqueo b, llanta l
+    WHERE i.id = b.id AND i.llanta_id = p.llanta_id AND l.id = i.llanta_id
+      AND i.cantidad_disponible >= p.cantidad
+    RETURNING i.llanta_id, l.precio_venta
+""")
+
+SQL_DIAGNOSTICO_STOCK = text("""
+    SELECT l.id AS llanta_id, l.sku, i.cantidad_disponible
+    FROM llanta l
+    LEFT JOIN inventario i ON i.llanta_id = l.id AND i.sucursal_id = :sucursal_id
+    WHERE l.id = ANY(CAST(:llanta_ids AS integer[]))
+""")
+
+SQL_INSERTAR_VENTA = text("""
+    WITH v AS (
+        INSERT INTO venta (fecha, sucursal_id, cliente_id, asesor_id, total)
+        VALUES (:fecha, :sucursal_id, :cliente_id, :asesor_id, :total)
+        RETURNING id, fecha
+    )
+    INSERT INTO detalleventa (venta_id, fecha, llanta_id, cantidad, precio_unitario, subtotal)
+    SELECT v.id, v.fecha, d.llanta_id, d.cantidad, d.precio_unitario, d.subtotal
+    FROM v, unnest(CAST(:llanta_ids AS integer[]),
+                   CAST(:cantidades AS integer[]),
+                   CAST(:precios AS double precision[]),
+                   CAST(:subtotales AS double precision[]))
+         AS d (llanta_id, cantidad, precio_unitario, subtotal)
+    RETURNING venta_id
+""")
+
+
+def _error_stock(session: Session, cantidades: Dict[int, int], sucursal_id: int) -> StockError:
+    """Explica por qué no se pudo descontar: la primera llanta sin inventario o sin stock suficiente."""
+    filas = {f.llanta_id: f for f in session.exec(SQL_DIAGNOSTICO_STOCK, params={
+        "sucursal_id": sucursal_id, "llanta_ids": list(cantidades)}).all()}
+    for llanta_id, qty in cantidades.items():
+        fila = filas.get(llanta_id)
+        if fila is None or fila.cantidad_disponible is None:
+            return StockError(f"No hay inventario registrado para la llanta {llanta_id} en la sucursal {sucursal_id}.")
+        if fila.cantidad_disponible < qty:
+            return StockError(f"Stock insuficiente para LLANTA {fila.sku}")
+    return StockError("No se pudo descontar el inventario")
+
+
+def crear_venta(session: Session, *, cliente_id: int, asesor_id: int,
+                items: List[Dict[str, int]], sucursal_id: int = SUCURSAL_PRINCIPAL_ID,
+                confirmar: bool = True) -> Venta:
+    """
+    Registra la venta con un número fijo de viajes a la BD sin importar cuántos ítems traiga:
+    una sentencia descuenta el stock (solo si alcanza) y retorna los precios, otra inserta la
+    venta con todo su detalle, y el commit. Ítems repetidos de la misma llanta se suman.
+    La Venta retornada se arma en memoria (no se relee de la BD). Con confirmar=False la
+    transacción queda abierta para que quien llama confirme (p. ej. junto con la Idempotency-Key).
+    """
+    cantidades: Dict[int, int] = {}
     for it in items:
-        llanta_id, qty = it["llanta_id"], it["cantidad"]
-        if llanta_id not in inventarios:
-            raise StockError(f"No hay inventario registrado para la llanta {llanta_id}.")
-        if inventarios[llanta_id].cantidad_disponible < qty:
-            sku = llantas[llanta_id].sku if llanta_id in llantas else llanta_id
-            raise StockError(f"Stock insuficiente para LLANTA {sku}")
-
-    venta = Venta(cliente_id=cliente_id, asesor_id=asesor_id, total=0.0)
-    session.add(venta)
-    session.flush()
-
-    total = 0.0
+        if it["cantidad"] <= 0:
+            raise StockError("La cantidad vendida debe ser mayor que 0")
+        cantidades[it["llanta_id"]] = cantidades.get(it["llanta_id"], 0) + it["cantidad"]
+    if not cantidades:
+        raise StockError("La venta debe incluir al menos una llanta")
+    ids = list(cantidades)
+
+    precios = {f.llanta_id: f.precio_venta for f in session.exec(SQL_DESCONTAR_STOCK, params={
+        "sucursal_id": sucursal_id,
+        "llanta_ids": ids,
+        "cantidades": [cantidades[i] for i in ids],
+    }).all()}
+    if len(precios) < len(ids):
+        # Revertir antes de diagnosticar: el UPDATE ya descontó las llantas que sí alcanzaban
+        session.rollback()
+        error = _error_stock(session, cantidades, sucursal_id)
+        session.rollback()
+        raise error
+
+    subtotales = [precios[i] * cantidades[i] for i in ids]
+    venta = Venta(fecha=datetime.utcnow(), sucursal_id=sucursal_id, cliente_id=cliente_id,
+                  asesor_id=asesor_id, total=sum(subtotales))
+    venta.id = session.exec(SQL_INSERTAR_VENTA, params={
+        "fecha": venta.fecha,
+        "sucursal_id": sucursal_id,
+        "cliente_id": cliente_id,
+        "asesor_id": asesor_id,
+        "total": venta.total,
+        "llanta_ids": ids,
+        "cantidades": [cantidades[i] for i in ids],
+        "precios": [precios[i] for i in ids],
+        "subtotales": subtotales,
+    }).first().venta_id
+    if confirmar:
+        session.commit()
+    return venta
+
+
+def transferir_stock(session: Session, *, origen_id: int, destino_id: int,
+                     items: List[Dict[str, int]]) -> List[Transferencia]:
+    """
+    Mueve stock entre sucursales en una sola transacción: o se mueven todos los ítems o ninguno.
+    Las filas se bloquean en orden (sucursal_id, llanta_id) para que transferencias cruzadas
+    concurrentes no se bloqueen mutuamente.
+    """
+    if origen_id == destino_id:
+        raise StockError("La sucursal de origen y la de destino deben ser distintas")
+    cantidades: Dict[int, int] = {}
     for it in items:
-        l = llantas[it["llanta_id"]]
-        qty = it["cantidad"]
-        precio = l.precio_venta
-        subtotal = precio * qty
-        det = DetalleVenta(venta_id=venta.id, llanta_id=l.id, cantidad=qty,
-                           precio_unitario=precio, subtotal=subtotal)
-        session.add(det)
-        total += subtotal
-
-        inv = inventarios[l.id]
-        inv.cantidad_disponible -= qty
-        session.add(inv)
-
-    venta.total = total
-    session.add(venta)
+        if it["cantidad"] <= 0:
+            raise StockError("La cantidad a transferir debe ser mayor que 0")
+        cantidades[it["llanta_id"]] = cantidades.get(it["llanta_id"], 0) + it["cantidad"]
+
+    filas = session.exec(
+        select(Inventario)
+        .where(Inventario.sucursal_id.in_([origen_id, destino_id]))
+        .where(Inventario.llanta_id.in_(list(cantidades)))
+        .order_by(Inventario.sucursal_id, Inventario.llanta_id)
+        .with_for_update()
+    ).all()
+    inventarios = {(inv.sucursal_id, inv.llanta_id): inv for inv in filas}
+
+    transferencias = []
+    for llanta_id, qty in cantidades.items():
+        origen = inventarios.get((origen_id, llanta_id))
+        destino = inventarios.get((destino_id, llanta_id))
+        if origen is None or destino is None:
+            session.rollback()
+            raise StockError(f"No hay inventario registrado para la llanta {llanta_id} en ambas sucursales.")
+        if origen.cantidad_disponible < qty:
+            session.rollback()
+            raise StockError(f"Stock insuficiente para la llanta {llanta_id} en la sucursal {origen_id}")
+        origen.cantidad_disponible -= qty
+        destino.cantidad_disponible += qty
+        session.add(origen)
+        session.add(destino)
+        transferencias.append(Transferencia(origen_id=origen_id, destino_id=destino_id,
+                                            llanta_id=llanta_id, cantidad=qty))
+
+    session.add_all(transferencias)
     session.commit()
-    session.refresh(venta)
-    return venta
+    for t in transferencias:
+        session.refresh(t)
+    return transferencias
+
+
+def disponibilidad_por_sucursal(session: Session, *, llanta_id: Optional[int] = None,
+                                sku: Optional[str] = None) -> List[Dict]:
+    """Stock de una llanta en todas las sucursales activas (una sola consulta)."""
+    query = (select(Sucursal.id, Sucursal.nombre, Llanta.id, Llanta.sku,
+                    Inventario.cantidad_disponible, Inventario.umbral_minimo)
+             .join(Inventario, Inventario.sucursal_id == Sucursal.id)
+             .join(Llanta, Llanta.id == Inventario.llanta_id)
+             .where(Sucursal.activa == True))
+    if llanta_id is not None:
+        query = query.where(Llanta.id == llanta_id)
+    if sku is not None:
+        query = query.where(Llanta.sku == sku)
+    return [
+        {"sucursal_id": s_id, "sucursal": nombre, "llanta_id": l_id, "sku": l_sku,
+         "cantidad_disponible": cantidad, "umbral_minimo": umbral}
+        for s_id, nombre, l_id, l_sku, cantidad, umbral in session.exec(query.order_by(Sucursal.id)).all()
+    ]
+
+
+def programar_cambio_precio(session: Session, *, tipo: str, valor: float,
+                            marca: Optional[str] = None, medida: Optional[str] = None,
+                            skus: Optional[List[str]] = None, todas: bool = False,
+                            efectiva_desde: Optional[datetime] = None) -> CambioPrecio:
+    """Registra un cambio de precio masivo; si ya es efectivo lo aplica de inmediato."""
+    if tipo not in ("porcentaje", "absoluto"):
+        raise PrecioError("tipo debe ser 'porcentaje' o 'absoluto'")
+    if not (marca or medida or skus or todas):
+        raise PrecioError("Indique marca, medida o skus (o todas=true para todo el catálogo)")
+
+    cambio = CambioPrecio(tipo=tipo, valor=valor, marca=marca, medida=medida,
+                          skus=json.dumps(skus) if skus else None,
+                          efectiva_desde=efectiva_desde or datetime.utcnow())
+    session.add(cambio)
+    session.commit()
+    session.refresh(cambio)
+
+    if cambio.efectiva_desde <= datetime.utcnow():
+        aplicar_cambio_precio(session, cambio.id)
+        session.refresh(cambio)
+    return cambio
+
+
+def aplicar_cambio_precio(session: Session, cambio_id: int, lote: int = PRECIOS_LOTE) -> int:
+    """
+    Aplica un CambioPrecio pendiente. Solo quien lo pasa de 'pendiente' a 'aplicando' lo
+    aplica; llamadas concurrentes (p. ej. el cron y programar_cambio_precio) retornan 0.
+    Si el proceso se interrumpe, el cambio queda en 'aplicando' y se continúa con
+    reanudar_cambio_precio. Retorna la cantidad de llantas actualizadas.
+    """
+    reclamado = session.exec(
+        update(CambioPrecio)
+        .where(CambioPrecio.id == cambio_id)
+        .where(CambioPrecio.estado == "pendiente")
+        .values(estado="aplicando")
+    )
+    session.commit()
+    if reclamado.rowcount == 0:
+        return 0
+    return _aplicar_lotes(session, cambio_id, lote)
+
+
+def reanudar_cambio_precio(session: Session, cambio_id: int, lote: int = PRECIOS_LOTE) -> int:
+    """Continúa un cambio que quedó en 'aplicando' desde la última llanta registrada en su historial."""
+    cambio = session.get(CambioPrecio, cambio_id)
+    if cambio is None:
+        raise PrecioError(f"Cambio de precio {cambio_id} no encontrado")
+    if cambio.estado != "aplicando":
+        raise PrecioError(f"El cambio de precio {cambio_id} está '{cambio.estado}', no 'aplicando'")
+    return _aplicar_lotes(session, cambio_id, lote)
+
+
+def _aplicar_lotes(session: Session, cambio_id: int, lote: int) -> int:
+    """
+    UPDATE por conjuntos en lotes de `lote` llantas por transacción, para no bloquear el
+    catálogo completo; cada lote guarda su historial en la misma sentencia. Cada lote bloquea
+    primero la fila del cambio y recalcula desde dónde seguir, así que dos ejecuciones del
+    mismo cambio se turnan lote a lote y nunca aplican el ajuste dos veces a una llanta.
+    """
+    cambio = session.get(CambioPrecio, cambio_id)
+    filtros = []
+    if cambio.marca:
+        filtros.append(Llanta.marca == cambio.marca)
+    if cambio.medida:
+        filtros.append(Llanta.medida == cambio.medida)
+    if cambio.skus:
+        filtros.append(Llanta.sku.in_(json.loads(cambio.skus)))
+
+    if cambio.tipo == "porcentaje":
+        precio = Llanta.precio_venta * (1 + cambio.valor / 100.0)
+    else:
+        precio = Llanta.precio_venta + cambio.valor
+    nuevo_precio = func.round(cast(func.greatest(precio, 0), Numeric), 2)
+
+    while True:
+        estado = session.exec(
+            select(CambioPrecio.estado).where(CambioPrecio.id == cambio_id).with_for_update()
+        ).one()
+        if estado != "aplicando":
+            session.rollback()  # otra ejecución ya lo terminó
+            break
+        ultimo = session.exec(
+            select(func.coalesce(func.max(HistorialPrecio.llanta_id), 0))
+            .where(HistorialPrecio.cambio_id == cambio_id)
+        ).one()
+
+        objetivo = (select(Llanta.id, Llanta.precio_venta)
+                    .where(*filtros, Llanta.id > ultimo)
+                    .order_by(Llanta.id).limit(lote)
+                    .with_for_update().cte("objetivo"))
+        actualizadas = (update(Llanta)
+                        .where(Llanta.id == objetivo.c.id)
+                        .values(precio_venta=nuevo_precio)
+                        .returning(Llanta.id.label("llanta_id"),
+                                   objetivo.c.precio_venta.label("anterior"),
+                                   Llanta.precio_venta.label("nuevo"))
+                        .cte("actualizadas"))
+        ahora = datetime.utcnow()
+        historial = (insert(HistorialPrecio)
+                     .from_select(["llanta_id", "cambio_id", "precio_anterior", "precio_nuevo", "fecha"],
+                                  select(actualizadas.c.llanta_id, literal(cambio_id),
+                                         actualizadas.c.anterior, actualizadas.c.nuevo, literal(ahora)))
+                     .returning(HistorialPrecio.llanta_id))
+        ids = session.exec(historial).scalars().all()
+
+        if len(ids) < lote:
+            # Último lote: se marca aplicado en la misma transacción, con la fila aún bloqueada
+            total = session.exec(
+                select(func.count(HistorialPrecio.id)).where(HistorialPrecio.cambio_id == cambio_id)
+            ).one()
+            session.exec(update(CambioPrecio)
+                         .where(CambioPrecio.id == cambio_id)
+                         .values(estado="aplicado", aplicado_en=datetime.utcnow(), llantas_afectadas=total))
+            session.commit()
+            break
+        session.commit()
+
+    return session.get(CambioPrecio, cambio_id).llantas_afectadas or 0
+
+
+def aplicar_cambios_programados(session: Session) -> List[int]:
+    """Aplica los cambios de precio pendientes cuya fecha efectiva ya llegó. Retorna sus ids."""
+    pendientes = session.exec(
+        select(CambioPrecio.id)
+        .where(CambioPrecio.estado == "pendiente")
+        .where(CambioPrecio.efectiva_desde <= datetime.utcnow())
+        .order_by(CambioPrecio.efectiva_desde, CambioPrecio.id)
+    ).all()
+    for cambio_id in pendientes:
+        aplicar_cambio_precio(session, cambio_id)
+    return list(pendientes)
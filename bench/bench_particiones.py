@@ -0,0 +1,138 @@
+"""
+Benchmark de latencia de inserción y lectura de ventas con histórico grande.
+
+Usar SOLO contra una base desechable (inserta millones de filas):
+    VENTAS_PARTICIONADAS=true python -m bench.bench_particiones --ventas 50000000 --meses 60
+    VENTAS_PARTICIONADAS=false python -m bench.bench_particiones --ventas 50000000 --meses 60
+
+Compara las dos salidas: con particiones la latencia de inserción y de las lecturas
+recientes/por detalle debe mantenerse estable al crecer el histórico.
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from app.database import engine, init_db
+from app.models import Asesor, Cliente, DetalleVenta, Inventario, Llanta, Venta
+from app.partitions import VENTAS_PARTICIONADAS, _sumar_meses, crear_particiones
+from app.services import SUCURSAL_PRINCIPAL_ID, crear_llanta_con_inventario, crear_venta
+
+BENCH_SKU = "BENCH-0001"
+
+
+def _asegurar_datos_base(session: Session):
+    llanta = session.exec(select(Llanta).where(Llanta.sku == BENCH_SKU)).first()
+    if llanta is None:
+        llanta = crear_llanta_con_inventario(session, sku=BENCH_SKU, marca="Bench", modelo="B1",
+                                             medida="205/55 R16", precio_venta=100.0)
+    cliente = session.exec(select(Cliente).where(Cliente.documento == "BENCH")).first()
+    if cliente is None:
+        cliente = Cliente(nombre="Cliente bench", documento="BENCH")
+        session.add(cliente)
+    asesor = session.exec(select(Asesor).where(Asesor.documento == "BENCH")).first()
+    if asesor is None:
+        asesor = Asesor(nombre="Asesor bench", documento="BENCH")
+        session.add(asesor)
+    inv = session.exec(select(Inventario)
+                       .where(Inventario.sucursal_id == SUCURSAL_PRINCIPAL_ID)
+                       .where(Inventario.llanta_id == llanta.id)).one()
+    inv.cantidad_disponible = 10 ** 9
+    session.add(inv)
+    session.commit()
+    return llanta.id, cliente.id, asesor.id
+
+
+def sembrar_historico(total: int, meses: int, llanta_id: int, cliente_id: int, asesor_id: int):
+    """Genera el histórico en el servidor (generate_series), un mes por transacción."""
+    hoy = datetime.utcnow().date()
+    inicio = _sumar_meses(hoy.replace(day=1), -meses)
+    if VENTAS_PARTICIONADAS:
+        crear_particiones(meses=meses, desde=inicio)
+
+    por_mes = total // meses
+    for i in range(meses):
+        mes = _sumar_meses(inicio, i)
+        siguiente = _sumar_meses(mes, 1)
+        t0 = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO venta (fecha, sucursal_id, cliente_id, asesor_id, total)
+                SELECT CAST(:mes AS timestamp) + random() * (CAST(:sig AS timestamp) - CAST(:mes AS timestamp)),
+                       :sucursal, :cliente, :asesor, 100.0
+                FROM generate_series(1, :n)
+            """), {"mes": mes, "sig": siguiente, "n": por_mes, "sucursal": SUCURSAL_PRINCIPAL_ID,
+                  "cliente": cliente_id, "asesor": asesor_id})
+            conn.execute(text("""
+                INSERT INTO detalleventa (venta_id, fecha, llanta_id, cantidad, precio_unitario, subtotal)
+                SELECT id, fecha, :llanta, 1, total, total
+                FROM venta WHERE fecha >= :mes AND fecha < :sig
+            """), {"mes": mes, "sig": siguiente, "llanta": llanta_id})
+        print(f"  {mes:%Y-%m}: {por_mes} ventas en {time.perf_counter() - t0:.1f}s")
+
+    with engine.connect() as conn:
+        conn.execute(text("ANALYZE venta"))
+        conn.execute(text("ANALYZE detalleventa"))
+
+
+def _medir(nombre: str, fn, muestras: int):
+    tiempos = []
+    for _ in range(muestras):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    tiempos.sort()
+    p = lambda q: tiempos[min(len(tiempos) - 1, int(q * len(tiempos)))]
+    print(f"{nombre:<28} p50={statistics.median(tiempos):7.2f} ms  "
+          f"p95={p(0.95):7.2f} ms  p99={p(0.99):7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ventas", type=int, default=1_000_000, help="Ventas históricas a generar")
+    parser.add_argument("--meses", type=int, default=60, help="Meses de histórico")
+    parser.add_argument("--muestras", type=int, default=200)
+    parser.add_argument("--sin-sembrar", action="store_true", help="Reusar el histórico existente")
+    args = parser.parse_args()
+
+    init_db()
+    with Session(engine) as session:
+        llanta_id, cliente_id, asesor_id = _asegurar_datos_base(session)
+
+    if not args.sin_sembrar:
+        print(f"Sembrando {args.ventas} ventas en {args.meses} meses "
+              f"({'particionado' if VENTAS_PARTICIONADAS else 'sin particiones'})...")
+        sembrar_historico(args.ventas, args.meses, llanta_id, cliente_id, asesor_id)
+
+    with engine.connect() as conn:
+        max_id = conn.execute(text("SELECT max(id) FROM venta")).scalar()
+
+    def insertar():
+        with Session(engine) as session:
+            crear_venta(session, cliente_id=cliente_id, asesor_id=asesor_id,
+                        items=[{"llanta_id": llanta_id, "cantidad": 1}])
+
+    def listar_recientes():
+        with Session(engine) as session:
+            session.exec(select(Venta).order_by(Venta.fecha.desc()).limit(50)).all()
+
+    def detalle_aleatorio():
+        with Session(engine) as session:
+            venta = session.get(Venta, random.randint(1, max_id))
+            if venta is not None:
+                session.exec(select(DetalleVenta)
+                             .where(DetalleVenta.venta_id == venta.id)
+                             .where(DetalleVenta.fecha == venta.fecha)).all()
+
+    print()
+    _medir("insertar venta", insertar, args.muestras)
+    _medir("listar 50 recientes", listar_recientes, args.muestras)
+    _medir("detalle venta aleatoria", detalle_aleatorio, args.muestras)
+
+
+if __name__ == "__main__":
+    main()
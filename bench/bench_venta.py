@@ -0,0 +1,95 @@
+"""
+Benchmark de latencia de crear_venta con retardo de red simulado.
+
+Cada sentencia SQL, commit y rollback duerme --latencia-ms antes de enviarse, como si la
+BD estuviera a esa distancia. Se mide la latencia y se cuentan los viajes a la BD por
+venta para distintos números de ítems; el conteo debe ser el mismo sin importar los ítems.
+
+Usar SOLO contra una base desechable:
+    python -m bench.bench_venta --latencia-ms 3 --items 1 5 20
+"""
+import argparse
+import statistics
+import time
+
+from sqlalchemy import event
+from sqlmodel import Session, select, update
+
+from app.database import engine, init_db
+from app.models import Asesor, Cliente, Inventario, Llanta
+from app.services import SUCURSAL_PRINCIPAL_ID, crear_llanta_con_inventario, crear_venta
+
+
+class RedSimulada:
+    def __init__(self, latencia_ms: float):
+        self.latencia = latencia_ms / 1000
+        self.viajes = 0
+
+    def _viaje(self, *args, **kwargs):
+        self.viajes += 1
+        time.sleep(self.latencia)
+
+    def instalar(self):
+        event.listen(engine, "before_cursor_execute", self._viaje)
+        event.listen(engine, "commit", self._viaje)
+        event.listen(engine, "rollback", self._viaje)
+
+
+def _asegurar_datos_base(session: Session, n_llantas: int):
+    llanta_ids = []
+    for i in range(n_llantas):
+        sku = f"BENCH-V-{i:04d}"
+        llanta = session.exec(select(Llanta).where(Llanta.sku == sku)).first()
+        if llanta is None:
+            llanta = crear_llanta_con_inventario(session, sku=sku, marca="Bench", modelo="V",
+                                                 medida="205/55 R16", precio_venta=100.0 + i)
+        llanta_ids.append(llanta.id)
+    session.exec(update(Inventario)
+                 .where(Inventario.sucursal_id == SUCURSAL_PRINCIPAL_ID)
+                 .where(Inventario.llanta_id.in_(llanta_ids))
+                 .values(cantidad_disponible=10 ** 9))
+    cliente = session.exec(select(Cliente).where(Cliente.documento == "BENCH")).first()
+    if cliente is None:
+        cliente = Cliente(nombre="Cliente bench", documento="BENCH")
+        session.add(cliente)
+    asesor = session.exec(select(Asesor).where(Asesor.documento == "BENCH")).first()
+    if asesor is None:
+        asesor = Asesor(nombre="Asesor bench", documento="BENCH")
+        session.add(asesor)
+    session.commit()
+    return llanta_ids, cliente.id, asesor.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latencia-ms", type=float, default=3.0, help="Retardo por viaje a la BD")
+    parser.add_argument("--items", type=int, nargs="+", default=[1, 5, 20], help="Ítems por venta")
+    parser.add_argument("--muestras", type=int, default=100)
+    args = parser.parse_args()
+
+    init_db()
+    with Session(engine) as session:
+        llanta_ids, cliente_id, asesor_id = _asegurar_datos_base(session, max(args.items))
+
+    red = RedSimulada(args.latencia_ms)
+    red.instalar()
+    print(f"Latencia simulada: {args.latencia_ms} ms por viaje\n")
+
+    for n in args.items:
+        items = [{"llanta_id": i, "cantidad": 1} for i in llanta_ids[:n]]
+        tiempos, viajes = [], []
+        with Session(engine) as session:
+            for _ in range(args.muestras):
+                antes = red.viajes
+                t0 = time.perf_counter()
+                crear_venta(session, cliente_id=cliente_id, asesor_id=asesor_id, items=items)
+                tiempos.append((time.perf_counter() - t0) * 1000)
+                viajes.append(red.viajes - antes)
+        tiempos.sort()
+        p95 = tiempos[min(len(tiempos) - 1, int(0.95 * len(tiempos)))]
+        print(f"{n:>3} ítems  viajes={statistics.median(viajes):4.0f}  "
+              f"p50={statistics.median(tiempos):7.2f} ms  p95={p95:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
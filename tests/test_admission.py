@@ -0,0 +1,51 @@
+"""
+Control de admisión: no necesita PostgreSQL (el engine no se conecta al importar).
+"""
+import asyncio
+import os
+
+_faltantes = {k: "sin-uso" for k in ("DB_HOST", "DB_PASSWORD") if not os.getenv(k)}
+os.environ.update(_faltantes)
+try:
+    from app.admission import ClaseAdmision, ControlAdmision
+finally:
+    for k in _faltantes:
+        del os.environ[k]
+
+
+def _control(espera_max: float = 1.0) -> ControlAdmision:
+    return ControlAdmision(1, {"general": ClaseAdmision(prioridad=0, limite=1, cola=10)}, espera_max)
+
+
+def test_cancelar_tras_despertar_no_pierde_el_cupo():
+    async def escenario():
+        control = _control()
+        assert await control.adquirir("general")
+        tarea = asyncio.create_task(control.adquirir("general"))
+        await asyncio.sleep(0)  # queda en cola
+        control.liberar("general")  # _despertar le asigna el cupo...
+        tarea.cancel()              # ...y se cancela antes de volver a ejecutarse
+        try:
+            if await tarea:
+                control.liberar("general")
+        except asyncio.CancelledError:
+            pass
+        assert control.activos_total == 0
+        assert control.activos["general"] == 0
+        assert control.en_cola["general"] == 0
+        assert await control.adquirir("general")
+
+    asyncio.run(escenario())
+
+
+def test_expira_en_cola():
+    async def escenario():
+        control = _control(espera_max=0.01)
+        assert await control.adquirir("general")
+        assert not await control.adquirir("general")
+        assert control.expiradas["general"] == 1
+        assert control.en_cola["general"] == 0
+        control.liberar("general")
+        assert control.activos_total == 0
+
+    asyncio.run(escenario())
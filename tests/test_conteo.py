@@ -0,0 +1,88 @@
+"""
+Conteo físico contra PostgreSQL real (SQL_CONTEO usa unnest, CTE con DML y FOR UPDATE).
+
+Usar SOLO contra una base desechable; se salta si no hay DB_HOST/DB_PASSWORD:
+    DB_HOST=localhost DB_PASSWORD=... DB_NAME=serviteca_test python -m pytest -q tests
+"""
+import os
+import uuid
+
+import pytest
+from dotenv import load_dotenv
+
+load_dotenv()
+if not (os.getenv("DB_HOST") and os.getenv("DB_PASSWORD")):
+    pytest.skip("Requiere PostgreSQL (DB_HOST y DB_PASSWORD)", allow_module_level=True)
+
+from sqlalchemy import text  # noqa: E402
+from sqlmodel import Session, select  # noqa: E402
+
+from app.database import engine, init_db  # noqa: E402
+from app.models import MovimientoInventario  # noqa: E402
+from app.services import (  # noqa: E402
+    SUCURSAL_PRINCIPAL_ID, aplicar_conteo, ajustar_inventario, crear_llanta_con_inventario
+)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def esquema():
+    assert init_db()
+
+
+@pytest.fixture
+def llanta_con_stock():
+    """Llanta nueva con 5 unidades en la sucursal principal; se borra al terminar."""
+    with Session(engine) as session:
+        llanta = crear_llanta_con_inventario(session, sku=f"TEST-{uuid.uuid4().hex[:12]}", marca="Test",
+                                             modelo="T1", medida="205/55 R16", precio_venta=100.0)
+        ajustar_inventario(session, llanta_id=llanta.id, delta=5, nuevo_umbral_minimo=1)
+        llanta_id, sku = llanta.id, llanta.sku
+    yield llanta_id, sku
+    with engine.begin() as conn:
+        for tabla in ("movimientoinventario", "inventario"):
+            conn.execute(text(f"DELETE FROM {tabla} WHERE llanta_id = :id"), {"id": llanta_id})
+        conn.execute(text("DELETE FROM llanta WHERE id = :id"), {"id": llanta_id})
+
+
+def _movimientos(session: Session, llanta_id: int, tipo: str):
+    return session.exec(select(MovimientoInventario)
+                        .where(MovimientoInventario.llanta_id == llanta_id)
+                        .where(MovimientoInventario.tipo == tipo)).all()
+
+
+def test_conteo_registra_diferencia_y_movimiento(llanta_con_stock):
+    llanta_id, sku = llanta_con_stock
+    desconocido = f"NO-EXISTE-{uuid.uuid4().hex[:8]}"
+
+    with Session(engine) as session:
+        reporte = aplicar_conteo(session, [
+            {"llanta_id": llanta_id, "cantidad": 2},
+            {"sku": sku, "cantidad": 1, "umbral_minimo": 4},  # mismo producto en otro estante
+            {"sku": desconocido, "cantidad": 7},
+        ])
+
+        assert reporte["sucursal_id"] == SUCURSAL_PRINCIPAL_ID
+        assert reporte["lineas"] == 3
+        assert reporte["llantas_actualizadas"] == 1
+        assert reporte["llantas_con_diferencia"] == 1
+        assert reporte["unidades_faltantes"] == 2
+        assert reporte["unidades_sobrantes"] == 0
+        assert reporte["no_encontrados"] == [desconocido]
+        assert reporte["diferencias"] == [{
+            "llanta_id": llanta_id, "sku": sku,
+            "cantidad_anterior": 5, "cantidad_contada": 3, "diferencia": -2,
+        }]
+
+        movimientos = _movimientos(session, llanta_id, "conteo")
+        assert [(m.sucursal_id, m.delta) for m in movimientos] == [(SUCURSAL_PRINCIPAL_ID, -2)]
+
+
+def test_conteo_sin_diferencia_no_registra_movimiento(llanta_con_stock):
+    llanta_id, _ = llanta_con_stock
+
+    with Session(engine) as session:
+        reporte = aplicar_conteo(session, [{"llanta_id": llanta_id, "cantidad": 5}])
+
+        assert reporte["llantas_actualizadas"] == 1
+        assert reporte["llantas_con_diferencia"] == 0
+        assert _movimientos(session, llanta_id, "conteo") == []
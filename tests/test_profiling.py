@@ -0,0 +1,58 @@
+"""
+Perfilado: rotación de PROFILING_DIR y token en /perfiles. No necesita PostgreSQL.
+"""
+import os
+import uuid
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+
+_faltantes = {k: "sin-uso" for k in ("DB_HOST", "DB_PASSWORD") if not os.getenv(k)}
+os.environ.update(_faltantes)
+try:
+    from app import profiling
+finally:
+    for k in _faltantes:
+        del os.environ[k]
+
+
+def _crear_perfil(directorio, mtime):
+    perfil_id = uuid.uuid4().hex
+    for extension in ("json", "folded"):
+        ruta = directorio / f"{perfil_id}.{extension}"
+        ruta.write_text("{}")
+        os.utime(ruta, (mtime, mtime))
+    return perfil_id
+
+
+def test_rotar_conserva_los_mas_recientes(tmp_path):
+    ids = [_crear_perfil(tmp_path, mtime) for mtime in (100, 200, 300, 400)]
+    (tmp_path / "otro.json").write_text("{}")
+
+    profiling._rotar(str(tmp_path), 2)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        [f"{i}.{e}" for i in ids[2:] for e in ("json", "folded")] + ["otro.json"]
+    )
+
+
+def _request(headers=(), query=b""):
+    return Request({"type": "http", "method": "GET", "path": "/perfiles/x",
+                    "headers": list(headers), "query_string": query})
+
+
+def test_rutas_de_perfiles_exigen_token(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", "secreto")
+
+    for request in (_request(), _request([(b"x-profile", b"otro")]), _request(query=b"profile=")):
+        with pytest.raises(HTTPException) as error:
+            profiling._exigir_token(request)
+        assert error.value.status_code == 403
+    profiling._exigir_token(_request([(b"x-profile", b"secreto")]))
+    profiling._exigir_token(_request(query=b"profile=secreto"))
+
+
+def test_instalar_sin_token_falla(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", None)
+    with pytest.raises(ValueError):
+        profiling.instalar_perfilado(FastAPI())
@@ -1,4 +1,5 @@
 import os
+import uuid
 import requests
 import streamlit as st
 import pandas as pd
@@ -27,8 +28,9 @@ def api_get(path: str, params=None):
     return r.json()
 
 
-def api_post(path: str, json=None, params=None):
-    r = requests.post(f"{API_BASE}{path}", json=json, params=params, timeout=API_TIMEOUT)
+def api_post(path: str, json=None, params=None, idempotency_key=None):
+    headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+    r = requests.post(f"{API_BASE}{path}", json=json, params=params, headers=headers, timeout=API_TIMEOUT)
     r.raise_for_status()
     return r.json()
 
@@ -40,7 +42,7 @@ def ensure_api_up():
         r.raise_for_status()
     except Exception as e:
         st.error(f"No logro conectarme a la API en **{API_BASE}**. "
-                 f"¿Está encendida? Ejecuta: `uvicorn app.api:app --reload`.\n\nDetalle: {e}")
+                 f"¿Está encendida? Ejecuta: `python -m app.server --reload`.\n\nDetalle: {e}")
         st.stop()
 
 
@@ -125,7 +127,7 @@ def page_inventario():
         step=1,
         value=current_qty,
         key=f"qty_{sel_id}",
-        help="Puedes sobrescribir la cantidad disponible. Calcularemos el delta automáticamente."
+        help="Puedes sobrescribir la cantidad disponible con la cantidad contada."
     )
     new_thr = st.number_input(
         "Umbral mínimo",
@@ -137,10 +139,11 @@ def page_inventario():
     )
 
     if st.button("Guardar cambios"):
-        delta = int(new_qty - current_qty)  # convertimos cantidad absoluta a delta
         try:
-            api_post(f"/inventario/{sel_id}/ajustar",
-                     json={"delta": delta, "umbral_minimo": int(new_thr)})
+            # Conteo con valor absoluto: no depende de la cantidad leída al cargar la página
+            api_post("/inventario/conteo",
+                     json={"items": [{"llanta_id": sel_id, "cantidad": int(new_qty),
+                                      "umbral_minimo": int(new_thr)}]})
             st.success("Inventario actualizado.")
             rerun()
         except requests.HTTPError as e:
@@ -233,19 +236,32 @@ def page_ventas():
         if not items:
             st.warning("Agrega al menos un ítem con cantidad > 0.")
         else:
+            payload = {
+                "cliente_id": cli_map[c_sel],
+                "asesor_id": ase_map[a_sel],
+                "items": items
+            }
+            # La misma venta pendiente reusa su Idempotency-Key en cada clic (p. ej. tras un timeout);
+            # solo se descarta al confirmarse la venta o si la API la rechaza
+            pendiente = st.session_state.get("venta_pendiente")
+            if pendiente is None or pendiente["payload"] != payload:
+                pendiente = {"payload": payload, "clave": str(uuid.uuid4())}
+                st.session_state["venta_pendiente"] = pendiente
             try:
-                res = api_post("/ventas", json={
-                    "cliente_id": cli_map[c_sel],
-                    "asesor_id": ase_map[a_sel],
-                    "items": items
-                })
-                st.success(f'Venta #{res["id"]} creada. Total: ${res["total"]}')
+                res = api_post("/ventas", json=payload, idempotency_key=pendiente["clave"])
+                st.session_state.pop("venta_pendiente", None)
+                st.success(f'Venta #{res["venta_id"]} creada. Total: ${res["total"]}')
                 rerun()
             except requests.HTTPError as e:
+                # 409 = la misma venta sigue en proceso: se conserva la clave para reintentar
+                if 400 <= e.response.status_code < 500 and e.response.status_code != 409:
+                    st.session_state.pop("venta_pendiente", None)
                 try:
                     st.error(e.response.json().get("detail", e.response.text))
                 except Exception:
                     st.error(str(e))
+            except requests.RequestException as e:
+                st.error(f"No se obtuvo respuesta de la API; vuelve a confirmar para reintentar la misma venta. ({e})")
 
     st.divider()
     st.markdown("### Ventas registradas")